@@ -1,27 +1,42 @@
 import asyncio
+import sys
+import time
 
 from dataclasses import dataclass, field
-from typing import Set, Callable, List, Optional
+from typing import Set, Callable, Dict, List, Optional
 
+from request_executor import RequestExecutor
 
-@dataclass
+
+# Tokens and places use slots, so that hosting many nets in one process stays cheap.
+@dataclass(slots=True)
 class Token:
     name: str = "default"
     value: str = "default"
 
 
-@dataclass
+@dataclass(slots=True)
 class Place:
     name: str
     tokens: List[Token] = field(default_factory=list)
+    listeners: List[Callable[["Place", int], None]] = field(default_factory=list, repr=False, compare=False)
+
+    def attach(self, listener: Callable[["Place", int], None]) -> None:
+        """Call `listener(place, delta)` whenever a token is added (+1) or removed (-1)."""
+        self.listeners.append(listener)
 
     def create_token(self, value: str = "default"):
         name = "default"
-        self.tokens.append(Token(name, value))
+        # Only exact str values can be interned; responses may be of any type.
+        self.tokens.append(Token(name, sys.intern(value) if type(value) is str else value))
+        for listener in self.listeners:
+            listener(self, 1)
 
     def remove_token(self):
         if len(self.tokens) > 0:
             self.tokens.pop()
+            for listener in self.listeners:
+                listener(self, -1)
 
 
 @dataclass
@@ -31,6 +46,11 @@ class Transition:
     output_places: List[Place]
     observer_func: Optional[Callable] = None
     request_funcs: Set[Callable] = field(default_factory=set)
+    # The places whose tokens each request function is started for (default: all output places).
+    request_places: Dict[Callable, List[Place]] = field(default_factory=dict)
+    executor: Optional[RequestExecutor] = None
+    # Functions called with the transition right after it fired (see `metrics.py`).
+    fire_hooks: List[Callable[["Transition"], None]] = field(default_factory=list, repr=False, compare=False)
 
 
 class PetriNet:
@@ -82,15 +102,27 @@ def transition_is_enabled(t: Transition) -> bool:
 
 async def fire_transition(t: Transition, value: str = "default", do_wait: bool = False) -> None:
     """Fire a transition by removing a token from each input place and adding a token to each output place.
-    Then, fire request functions associated with the transition."""
+    Then, fire request functions associated with the transition.
+    If the transition has an executor, the request functions are run through it."""
     assert transition_is_enabled(t), "Transition is not enabled"
 
     for place in t.input_places:
         place.remove_token()
     for place in t.output_places:
         place.create_token(value=value)
-
-    tasks = [asyncio.create_task(func()) for func in t.request_funcs]
+    for hook in t.fire_hooks:
+        hook(t)
+
+    if t.executor is None:
+        tasks = [asyncio.create_task(func()) for func in t.request_funcs]
+    else:
+        # Requests waiting for the consumed tokens will not be answered anymore.
+        if t.observer_func is None:
+            t.executor.cancel_requests(t.input_places)
+        tasks = [
+            await t.executor.submit(t.name, func, t.request_places.get(func, t.output_places))
+            for func in t.request_funcs
+        ]
     if tasks and do_wait:
         await asyncio.gather(*tasks)
 
@@ -111,6 +143,66 @@ async def fire_transitions(net: PetriNet) -> None:
         await fire_transition(transition)
 
 
+class Scheduler:
+    """Fire the transitions of a net whenever tokens are added to their input places,
+    instead of polling the net at a fixed interval.
+
+    Transitions with an observer function are fired by their observers, as in
+    `fire_transitions`. The scheduler finishes once a token reaches one of the
+    `terminal_places`. If `latencies` is given, the time from each wakeup until
+    the enabled transitions have been fired is appended to it.
+    """
+
+    def __init__(self, net: PetriNet, terminal_places: List[Place], latencies: Optional[List[float]] = None):
+        self.net = net
+        self.terminal_places = terminal_places
+        self.latencies = latencies
+        self.woken_at = time.perf_counter()
+        self.wakeup = asyncio.Event()
+        self.done = asyncio.Event()
+
+        # Only places that feed a transition without an observer wake the scheduler.
+        self.scheduled = [t for t in net.transitions if t.observer_func is None]
+        self.trigger_places = set()
+        for transition in self.scheduled:
+            self.trigger_places.update(id(place) for place in transition.input_places)
+
+        for place in net.places:
+            place.attach(self.on_change)
+
+    def on_change(self, place: Place, delta: int) -> None:
+        if delta <= 0:
+            return
+        if any(place is p for p in self.terminal_places):
+            self.done.set()
+        elif id(place) not in self.trigger_places:
+            return
+        if not self.wakeup.is_set():
+            self.woken_at = time.perf_counter()
+            self.wakeup.set()
+
+    async def run(self) -> None:
+        self.woken_at = time.perf_counter()
+        if any(len(place.tokens) > 0 for place in self.terminal_places):
+            self.done.set()
+
+        while not self.done.is_set():
+            self.wakeup.clear()
+            await fire_transitions(self.net)
+            if self.latencies is not None:
+                self.latencies.append(time.perf_counter() - self.woken_at)
+            # Firing may have added tokens to trigger places, in which case
+            # `wakeup` is already set and the loop continues right away. The same
+            # goes for transitions that are still enabled after firing once, e.g.
+            # when an input place holds several tokens. Neither path yields, so
+            # yield here; otherwise a transition that stays enabled (a self-loop)
+            # would block the event loop.
+            if any(transition_is_enabled(t) for t in self.scheduled):
+                await asyncio.sleep(0)
+                continue
+            await self.wakeup.wait()
+
+
 def create_user_observer(t: Transition):
     async def user_observer(mood: str) -> None:
         if not transition_is_enabled(t):
@@ -168,29 +260,32 @@ async def main():
 
     t_start_conv.request_funcs.add(request_user)
     t_start_conv.request_funcs.add(request_api)
+    t_start_conv.request_places[request_user] = [p_req_user]
+    t_start_conv.request_places[request_api] = [p_req_api]
 
     net = PetriNet()
     net.places = [p_init, p_req_user, p_user_res_ready, p_req_api, p_api_res_ready, p_end]
     net.transitions = [t_start_conv, t_res_user, t_res_api, t_end_conv]
 
+    executor = RequestExecutor(max_concurrency=10, max_concurrency_per_transition=2, timeout=30)
+    for transition in net.transitions:
+        transition.executor = executor
+
     user = User()
     user.attach(t_res_user.observer_func)
 
     api = WeatherAPI()
     api.attach(t_res_api.observer_func)
 
+    scheduler = Scheduler(net, terminal_places=[p_end])
     p_init.create_token()
 
-    while True:
-        # print_petri_net(net)
-        await fire_transitions(net)
-
-        await asyncio.sleep(1)
-
-        if len(p_end.tokens) > 0:
-            break
+    await scheduler.run()
     print_petri_net(net)
 
+    await executor.join()
+    print(f"Requests: {executor.stats}")
+
 
 if __name__ == "__main__":
     asyncio.run(main())
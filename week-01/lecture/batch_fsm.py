@@ -0,0 +1,153 @@
+"""
+Stepping the finite state machine of `fsm.py` for many sessions at once.
+
+The current state of every session is an entry of a NumPy integer array, and
+one event per session is applied in a single indexing operation on the
+transition table from `compiled_fsm.py`. The last recorded value of every event
+type (e.g. "Weather") is kept per session as the index of the event that
+carried it. `recommend_activity` is only called for the sessions that are in
+`TerminalState` after the step.
+"""
+import contextlib
+import os
+import time
+
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from compiled_fsm import ALPHABET, CompiledFSM, CompiledStateMachine, compile_fsm
+from fsm import WeatherState, recommend_activity
+
+# The event index of sessions that receive no event in a step.
+NO_EVENT = -2
+
+
+class BatchStateMachine:
+    def __init__(
+            self,
+            fsm: CompiledFSM,
+            n_sessions: int,
+            on_terminal: Optional[Callable[[np.ndarray, Dict[str, List[str]]], None]] = None,
+    ):
+        """
+        fsm: The compiled state machine shared by all sessions.
+        on_terminal: Called with the ids of the sessions in a terminal state
+            after a step, and their parameters. By default, `recommend_activity`
+            is called for each of them.
+        """
+        self.fsm = fsm
+        self.on_terminal = on_terminal or self._recommend
+        self.table = np.array(fsm.table, dtype=np.int64).reshape(len(fsm.states), fsm.n_events)
+        self.records = np.array(fsm.records, dtype=bool).reshape(self.table.shape)
+        self.is_terminal = np.array(fsm.is_terminal, dtype=bool)
+
+        self.types = list(dict.fromkeys(event.type for event in fsm.events))
+        self.event_type = np.array([self.types.index(event.type) for event in fsm.events], dtype=np.int64)
+        self.values = np.array([event.value for event in fsm.events], dtype=object)
+
+        self.states = np.full(n_sessions, fsm.initial, dtype=np.int64)
+        # parameters[type, session]: the index of the last recorded event of that type, or -1.
+        self.parameters = np.full((len(self.types), n_sessions), -1, dtype=np.int64)
+
+    def reset(self, sessions: Optional[np.ndarray] = None) -> None:
+        """Reset some (by default all) sessions to the initial state."""
+        if sessions is None:
+            sessions = slice(None)
+        self.states[sessions] = self.fsm.initial
+        self.parameters[:, sessions] = -1
+
+    def get_parameters(self, sessions: np.ndarray) -> Dict[str, List[str]]:
+        """Return the recorded values of each event type for some sessions (None if not set)."""
+        result = {}
+        for t, name in enumerate(self.types):
+            indices = self.parameters[t, sessions]
+            values = np.where(indices >= 0, self.values[np.maximum(indices, 0)], None)
+            result[name] = values.tolist()
+        return result
+
+    def step(self, events: np.ndarray) -> np.ndarray:
+        """Apply one event index per session (`NO_EVENT` to skip a session, -1 for an
+        unknown event). Returns the ids of the sessions in a terminal state."""
+        active = events != NO_EVENT
+        known = np.flatnonzero(events >= 0)
+        event = events[known]
+        state = self.states[known]
+
+        recorded = self.records[state, event]
+        sessions, recorded_events = known[recorded], event[recorded]
+        self.parameters[self.event_type[recorded_events], sessions] = recorded_events
+        self.states[known] = self.table[state, event]
+
+        terminal = np.flatnonzero(active & self.is_terminal[self.states])
+        if len(terminal) > 0:
+            self.on_terminal(terminal, self.get_parameters(terminal))
+        return terminal
+
+    def _recommend(self, sessions: np.ndarray, parameters: Dict[str, List[str]]) -> None:
+        for weather, mood in zip(parameters["Weather"], parameters["Mood"]):
+            recommend_activity(weather, mood)
+
+
+def generate_events(fsm: CompiledFSM, n_steps: int, n_sessions: int, seed: int = 0) -> np.ndarray:
+    """Generate random event indices, including unknown events and sessions without events."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(NO_EVENT, fsm.n_events, size=(n_steps, n_sessions))
+
+
+def main() -> None:
+    fsm = compile_fsm(WeatherState(), ALPHABET)
+    n_sessions, n_steps = 100_000, 4
+    events = generate_events(fsm, n_steps, n_sessions)
+
+    # Check against single-session machines on a subset of the sessions.
+    n_checked = 1000
+    calls: List[tuple] = []
+    batch = BatchStateMachine(
+        fsm, n_checked,
+        on_terminal=lambda s, p: calls.extend(zip(s.tolist(), p["Weather"], p["Mood"])),
+    )
+    expected: List[tuple] = []
+    machines = []
+    for i in range(n_checked):
+        machine = CompiledStateMachine(fsm)
+        machine.on_terminal = lambda p, i=i: expected.append((i, p["Weather"], p["Mood"]))
+        machines.append(machine)
+    for step in range(n_steps):
+        batch.step(events[step, :n_checked])
+        for i, machine in enumerate(machines):
+            if events[step, i] != NO_EVENT:
+                machine.handle_index(int(events[step, i]))
+    print(f"Same states: {[m.state for m in machines] == batch.states.tolist()}")
+    print(f"Same recommendations: {sorted(calls) == sorted(expected)}")
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        machines = [CompiledStateMachine(fsm) for _ in range(n_sessions)]
+        start = time.perf_counter()
+        for step in range(n_steps):
+            for machine, event_index in zip(machines, events[step].tolist()):
+                if event_index != NO_EVENT:
+                    machine.handle_index(event_index)
+        elapsed_single = time.perf_counter() - start
+
+        batch = BatchStateMachine(fsm, n_sessions)
+        start = time.perf_counter()
+        for step in range(n_steps):
+            batch.step(events[step])
+        elapsed_batch = time.perf_counter() - start
+
+    # The same, without the cost of printing the recommendations.
+    batch = BatchStateMachine(fsm, n_sessions, on_terminal=lambda s, p: None)
+    start = time.perf_counter()
+    for step in range(n_steps):
+        batch.step(events[step])
+    elapsed_silent = time.perf_counter() - start
+
+    print(f"Sessions: {n_sessions}, Steps: {n_steps}")
+    print(f"CompiledStateMachine per session: {elapsed_single * 1000 / n_steps:.1f} ms/step")
+    print(f"BatchStateMachine:                {elapsed_batch * 1000 / n_steps:.1f} ms/step")
+    print(f"BatchStateMachine (no output):    {elapsed_silent * 1000 / n_steps:.1f} ms/step")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+A table-driven version of the finite state machine in `fsm.py`.
+
+`StateMachine.handle` creates new state objects and a `Transition` on every
+event. Here, the `State` subclasses are compiled once into a transition table:
+each state class becomes an integer, each (type, value) pair of the event
+alphabet becomes an integer, and `table[state * n_events + event]` holds the
+next state. Handling an event is then a dict lookup and a list index.
+"""
+import contextlib
+import io
+import os
+import random
+import time
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fsm import Event, State, StateMachine, TerminalState, WeatherState, recommend_activity
+from tracing import NullSink
+
+
+@dataclass
+class CompiledFSM:
+    states: List[State]
+    events: List[Event]
+    event_index: Dict[Event, int]
+    table: List[int]
+    # Whether the transition records the event value in the parameters.
+    records: List[bool]
+    is_terminal: List[bool]
+    initial: int = 0
+
+    @property
+    def n_events(self) -> int:
+        return len(self.events)
+
+    def encode(self, events: Sequence[Event]) -> List[int]:
+        """Translate events into event indices. Unknown events become -1."""
+        return [self.event_index.get(event, -1) for event in events]
+
+
+def compile_fsm(
+        initial: State,
+        alphabet: Sequence[Event],
+        terminal_types: Tuple[type, ...] = (TerminalState,),
+) -> CompiledFSM:
+    """Compile the states reachable from `initial` with the events in `alphabet`.
+
+    Each state class is instantiated once and probed with every event of the
+    alphabet. Events outside the alphabet are assumed not to trigger a
+    transition, as is the case for all states in `fsm.py`.
+    """
+    events = list(dict.fromkeys(alphabet))
+    event_index = {event: i for i, event in enumerate(events)}
+
+    states: List[State] = [initial]
+    state_index: Dict[type, int] = {type(initial): 0}
+    table: List[int] = []
+    records: List[bool] = []
+
+    i = 0
+    while i < len(states):
+        for event in events:
+            transition = states[i].next(event)
+            target_type = type(transition.target)
+            if target_type not in state_index:
+                state_index[target_type] = len(states)
+                states.append(transition.target)
+            table.append(state_index[target_type])
+            records.append(transition.event is not None)
+        i += 1
+
+    return CompiledFSM(
+        states=states,
+        events=events,
+        event_index=event_index,
+        table=table,
+        records=records,
+        is_terminal=[isinstance(state, terminal_types) for state in states],
+    )
+
+
+class CompiledStateMachine:
+    """Runs a `CompiledFSM` with the semantics of `StateMachine.handle`, without printing."""
+
+    def __init__(
+            self,
+            fsm: CompiledFSM,
+            on_terminal: Optional[Callable[[Dict[str, str]], None]] = None,
+    ):
+        self.fsm = fsm
+        self.on_terminal = on_terminal or (lambda p: recommend_activity(p["Weather"], p["Mood"]))
+        self.state = fsm.initial
+        self.parameters: Dict[str, str] = {}
+
+    def reset(self) -> None:
+        self.state = self.fsm.initial
+        self.parameters.clear()
+
+    def handle(self, event: Event) -> None:
+        self.handle_index(self.fsm.event_index.get(event, -1), event)
+
+    def handle_index(self, event_index: int, event: Optional[Event] = None) -> None:
+        """Handle an event given by its index in `fsm.events`."""
+        fsm = self.fsm
+        if event_index >= 0:
+            k = self.state * fsm.n_events + event_index
+            if fsm.records[k]:
+                event = fsm.events[event_index]
+                self.parameters[event.type] = event.value
+            self.state = fsm.table[k]
+        if fsm.is_terminal[self.state]:
+            self.on_terminal(self.parameters)
+
+    def run(self, event_indices: Sequence[int]) -> None:
+        for event_index in event_indices:
+            self.handle_index(event_index)
+
+
+ALPHABET = [
+    Event("Weather", "sunny"),
+    Event("Weather", "rainy"),
+    Event("Mood", "active"),
+    Event("Mood", "chill"),
+]
+
+
+def generate_conversations(n: int, seed: int = 0) -> List[List[Event]]:
+    """Generate conversations of a weather and a mood event, sometimes with invalid events in between."""
+    rng = random.Random(seed)
+    invalid = [Event("Weather", "cloudy"), Event("Mood", "sleepy"), Event("Mood", "active")]
+    conversations = []
+    for _ in range(n):
+        conversation = [rng.choice(ALPHABET[:2]), rng.choice(ALPHABET[2:])]
+        if rng.random() < 0.3:
+            conversation.insert(0, rng.choice(invalid))
+        conversations.append(conversation)
+    return conversations
+
+
+def check_equivalence(fsm: CompiledFSM, conversations: Sequence[Sequence[Event]]) -> None:
+    """Run every conversation through a `StateMachine` and a `CompiledStateMachine`
+    and assert that they print the same recommendations, end in the same state
+    and collect the same parameters."""
+    csm = CompiledStateMachine(fsm)
+    for conversation in conversations:
+        sm = StateMachine(NullSink())
+        csm.reset()
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            for event in conversation:
+                sm.handle(event)
+        expected = output.getvalue()
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            for event in conversation:
+                csm.handle(event)
+        actual = output.getvalue()
+        assert actual == expected, f"{conversation}: recommended {actual!r}, expected {expected!r}"
+        assert type(fsm.states[csm.state]) is type(sm.state), f"{conversation}: ended in {fsm.states[csm.state]}, expected {sm.state}"
+        assert csm.parameters == sm.parameters, f"{conversation}: parameters {csm.parameters}, expected {sm.parameters}"
+
+
+def main() -> None:
+    fsm = compile_fsm(WeatherState(), ALPHABET)
+    print(f"States: {[str(state) for state in fsm.states]}")
+    print("Transition table:")
+    for s, state in enumerate(fsm.states):
+        targets = [str(fsm.states[fsm.table[s * fsm.n_events + e]]) for e in range(fsm.n_events)]
+        print(f"  {state}: {dict(zip(map(tuple, fsm.events), targets))}")
+
+    conversations = generate_conversations(100_000)
+    n_events = sum(len(c) for c in conversations)
+    check_equivalence(fsm, conversations)
+    print(f"Both machines agree on all {len(conversations)} conversations")
+
+    # The recommendations were compared above; here the output is discarded.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        sm = StateMachine()
+        start = time.perf_counter()
+        for conversation in conversations:
+            sm.state = WeatherState()
+            sm.parameters = {}
+            for event in conversation:
+                sm.handle(event)
+        elapsed_classes = time.perf_counter() - start
+
+        csm = CompiledStateMachine(fsm)
+        encoded = [fsm.encode(conversation) for conversation in conversations]
+        start = time.perf_counter()
+        for conversation in encoded:
+            csm.reset()
+            csm.run(conversation)
+        elapsed_compiled = time.perf_counter() - start
+
+    print(f"Events: {n_events}")
+    print(f"StateMachine:         {elapsed_classes * 1e9 / n_events:.0f} ns/event")
+    print(f"CompiledStateMachine: {elapsed_compiled * 1e9 / n_events:.0f} ns/event")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Compiled decision tables for the frame-based agent in `frame.py`.
+
+`determine_action` and `recommend_activity` in `frame.py` check the slots of a
+frame one case at a time. Here, the cases are written as a table of rules,
+each mapping slot values to an action. The table is compiled once into an
+array with one entry for every combination of slot values: each slot value
+(including "not set") gets a digit from a small dict per slot, the digits of a
+frame form a mixed-radix number, and that number indexes the array. Looking up
+a frame is then one dict lookup per slot and a list index, and a batch of
+frames is looked up with `np.ravel_multi_index` and one NumPy indexing
+operation. Frames with values outside the table (e.g. `Weather.SUNNY` instead
+of "sunny") are matched against the rules directly, so they get the same
+action as from the original if/elif chain.
+
+`frame.py` keeps its if/elif chain: it decides one action per user turn, so
+there is nothing to speed up there, and it defines the enums the tables here
+are built from, so importing this module from it would be circular. The
+tables are meant for simulated or logged frames processed in bulk.
+"""
+import itertools
+import math
+import operator
+import time
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from frame import Action, Frame, Mood, Weather
+import frame as frame_agent
+
+
+class _AnyValue:
+    def __repr__(self):
+        return "ANY"
+
+
+# A rule value that matches any value of the slot except "not set" (None).
+ANY = _AnyValue()
+
+Rule = Tuple[Dict[str, Any], Any]
+
+
+class DecisionTable:
+    def __init__(self, slots: Dict[str, Sequence[Any]], rules: Sequence[Rule], default: Any = None):
+        """
+        slots: The possible values of each slot. None ("not set") is always possible.
+            The slot names must be identifiers.
+        rules: (conditions, action) pairs. A condition maps a slot to a value, None
+            or ANY; slots without a condition match anything. The first matching
+            rule wins, like the cases of a `match` statement.
+        default: The action of frames that match no rule.
+        """
+        self.slot_names = list(slots)
+        for name in self.slot_names:
+            if not name.isidentifier():
+                raise ValueError(f"Slot name is not an identifier: {name!r}")
+        self.rules, self.default = list(rules), default
+        self.domains = [[None] + list(values) for values in slots.values()]
+        # One small value -> code dict per slot.
+        self.codes = [{value: code for code, value in enumerate(domain)} for domain in self.domains]
+        self.radices = tuple(len(domain) for domain in self.domains)
+        # The last slot is the least significant digit.
+        self.strides = [math.prod(self.radices[i + 1:]) for i in range(len(self.radices))]
+
+        self.actions: List[Any] = [default]
+        action_index = {}
+        table = np.zeros(math.prod(self.radices), dtype=np.int64)
+        for key, values in enumerate(itertools.product(*self.domains)):
+            action = self._first_match(dict(zip(self.slot_names, values)), rules)
+            if action is None:
+                continue
+            if action not in action_index:
+                action_index[action] = len(self.actions)
+                self.actions.append(action)
+            table[key] = action_index[action]
+        self.table = table.astype(np.min_scalar_type(len(self.actions) - 1))
+        self.lookup = self._compile_lookup()
+
+    def _compile_lookup(self) -> Callable[[Any], Any]:
+        """Generate `lookup` for these slots: with the codes premultiplied by the
+        strides, the key of a frame is a sum of one dict lookup per slot. A
+        generated expression avoids the per-slot loop, which would cost more
+        than the if/elif chain the table replaces."""
+        namespace = {
+            "_actions": [self.actions[i] for i in self.table.tolist()],
+            "_fallback": self._lookup_rules,
+        }
+        terms = []
+        for i, (name, codes, stride) in enumerate(zip(self.slot_names, self.codes, self.strides)):
+            namespace[f"_codes{i}"] = {value: code * stride for value, code in codes.items()}
+            terms.append(f"_codes{i}[frame.{name}]")
+        source = (
+            "def lookup(frame):\n"
+            "    try:\n"
+            f"        return _actions[{' + '.join(terms) or '0'}]\n"
+            "    except (KeyError, TypeError):\n"
+            "        return _fallback(frame)\n"
+        )
+        exec(source, namespace)
+        lookup = namespace["lookup"]
+        lookup.__doc__ = "The action of a frame (any object with the slots as attributes)."
+        return lookup
+
+    def _lookup_rules(self, frame: Any) -> Any:
+        # A value outside the table (or unhashable): match the rules directly.
+        values = {name: getattr(frame, name) for name in self.slot_names}
+        action = self._first_match(values, self.rules)
+        return self.default if action is None else action
+
+    @staticmethod
+    def _first_match(values: Dict[str, Any], rules: Sequence[Rule]) -> Optional[Any]:
+        for conditions, action in rules:
+            if all(
+                values[slot] is not None if expected is ANY else values[slot] == expected
+                for slot, expected in conditions.items()
+            ):
+                return action
+        return None
+
+    def key(self, frame: Any) -> int:
+        """The mixed-radix key of a frame (any object with the slots as attributes)."""
+        return sum(codes[getattr(frame, name)] * stride for name, codes, stride in
+                   zip(self.slot_names, self.codes, self.strides))
+
+    def encode(self, frames: Sequence[Any]) -> np.ndarray:
+        """Encode frames into an array of slot codes of shape (frames, slots).
+        Values outside `slots` raise KeyError; such frames need `lookup`."""
+        codes = np.empty((len(frames), len(self.slot_names)), dtype=np.int64)
+        for i, (name, slot_codes) in enumerate(zip(self.slot_names, self.codes)):
+            codes[:, i] = list(map(slot_codes.__getitem__, map(operator.attrgetter(name), frames)))
+        return codes
+
+    def lookup_batch(self, codes: np.ndarray) -> np.ndarray:
+        """Look up the action indices (into `actions`) of a batch of encoded frames."""
+        return self.table[np.ravel_multi_index(codes.T, self.radices)]
+
+
+SLOTS = {
+    "weather": [weather.value for weather in Weather],
+    "mood": [mood.value for mood in Mood],
+}
+
+NEXT_ACTION = DecisionTable(SLOTS, [
+    ({"weather": None, "mood": None}, Action.ASK_ALL),
+    ({"weather": None}, Action.ASK_WEATHER),
+    ({"mood": None}, Action.ASK_MOOD),
+    ({}, Action.RECOMMEND_ACTIVITY),
+])
+
+ACTIVITY = DecisionTable(SLOTS, [
+    ({"weather": "sunny", "mood": "active"}, "You should go cycling!"),
+    ({"weather": "sunny", "mood": "chill"}, "You should go on a picnic!"),
+    ({"weather": "rainy", "mood": "active"}, "You should go indoor climbing!"),
+    ({"weather": "rainy", "mood": "chill"}, "You should watch a movie!"),
+])
+
+
+def determine_action(frame: Frame) -> Action:
+    """Same as `frame.determine_action`, using the compiled table."""
+    return NEXT_ACTION.lookup(frame)
+
+
+def recommend_activity(frame: Frame) -> None:
+    """Same as `frame.recommend_activity`, using the compiled table."""
+    activity = ACTIVITY.lookup(frame)
+    if activity is None:
+        raise ValueError(f"Frame is not fully specified: {frame}")
+    print(activity)
+
+
+def main() -> None:
+    frames = [Frame(weather=w, mood=m) for w, m in itertools.product(*NEXT_ACTION.domains)]
+
+    n = 1_000_000
+    rng = np.random.default_rng(0)
+    batch = [frames[i] for i in rng.integers(0, len(frames), size=n)]
+
+    start = time.perf_counter()
+    expected = [frame_agent.determine_action(frame) for frame in batch]
+    elapsed_chain = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actions = [determine_action(frame) for frame in batch]
+    elapsed_table = time.perf_counter() - start
+
+    start = time.perf_counter()
+    codes = NEXT_ACTION.encode(batch)
+    elapsed_encode = time.perf_counter() - start
+    start = time.perf_counter()
+    indices = NEXT_ACTION.lookup_batch(codes)
+    elapsed_batch = time.perf_counter() - start
+
+    print(f"Same batch results: {actions == expected == [NEXT_ACTION.actions[i] for i in indices]}")
+    print(f"determine_action (if/elif):  {elapsed_chain * 1e9 / n:.0f} ns/frame")
+    print(f"determine_action (table):    {elapsed_table * 1e9 / n:.0f} ns/frame")
+    print(f"encode + lookup_batch:       {(elapsed_encode + elapsed_batch) * 1e9 / n:.0f} ns/frame "
+          f"(encode {elapsed_encode * 1e9 / n:.0f}, lookup_batch {elapsed_batch * 1e9 / n:.1f})")
+
+
+if __name__ == "__main__":
+    main()
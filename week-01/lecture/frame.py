@@ -1,11 +1,12 @@
 """
 A sample implementation of a frame-based agent.
 """
-import copy
-
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
 
+from tracing import PrintSink, TraceRecord, trace
+from utterance_parser import SlotParser
+
 
 class Weather(Enum):
     RAINY = "rainy"
@@ -17,7 +18,8 @@ class Mood(Enum):
     CHILL = "chill"
 
 
-@dataclass
+# Frames are immutable, so an updated frame can share its values with the old one.
+@dataclass(frozen=True, slots=True)
 class Frame:
     weather: Weather = None
     mood: Mood = None
@@ -37,13 +39,13 @@ class Action(Enum):
 
 
 def update_frame(input_event: InputEvent, frame: Frame) -> Frame:
-    """Process the input and update the frame."""
-    frame = copy.deepcopy(frame)
+    """Process the input and return the updated frame. The given frame is not changed."""
+    changes = {}
     if input_event.weather is not None:
-        frame.weather = input_event.weather
+        changes["weather"] = input_event.weather
     if input_event.mood is not None:
-        frame.mood = input_event.mood
-    return frame
+        changes["mood"] = input_event.mood
+    return replace(frame, **changes) if changes else frame
 
 
 def determine_action(frame: Frame) -> Action:
@@ -73,7 +75,17 @@ def recommend_activity(frame: Frame) -> None:
             raise ValueError(f"Frame is not fully specified: {frame}")
 
 
+def format_record(record: TraceRecord) -> str:
+    """Format a trace record of the agent. The transition is a (previous frame, frame) pair."""
+    return f"Current Frame: {record.transition[1]}\n"
+
+
 if __name__ == "__main__":
+    sink = PrintSink(format_record)
+    parser = SlotParser(
+        {"weather": [item.value for item in Weather], "mood": [item.value for item in Mood]},
+        InputEvent,
+    )
     current_frame = Frame()
     while True:
         # Determine the action based on the frame.
@@ -96,19 +108,7 @@ if __name__ == "__main__":
             raise ValueError(f"Unknown action: {action}")
 
         # Parse the response and update the frame.
-        items = response.split(";")
-        event = InputEvent()
-        for item in items:
-            try:
-                key, value = item.split(":")
-                key = key.strip()
-                value = value.strip()
-                if key == "weather" and value in (item.value for item in Weather):
-                    event.weather = value
-                elif key == "mood" and value in (item.value for item in Mood):
-                    event.mood = value
-            except ValueError:
-                pass
-
+        event = parser.parse(response)
+        previous_frame = current_frame
         current_frame = update_frame(event, current_frame)
-        print(f"Current Frame: {current_frame}\n")
+        trace(sink, action, event, (previous_frame, current_frame))
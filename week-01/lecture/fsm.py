@@ -1,8 +1,13 @@
 """
 A sample implementation of a finite state machine (FSM).
 """
+import time
+
 from abc import ABC, abstractmethod
 from collections import namedtuple
+from typing import Optional
+
+from tracing import PrintSink, TraceRecord, TraceSink, trace
 
 
 Event = namedtuple("Event", ["type", "value"])
@@ -11,6 +16,9 @@ Transition = namedtuple("Transition", ["source", "target", "event"])
 
 
 class State(ABC):
+    # Traced when the state rejects an event, if not None.
+    rejection_message: Optional[str] = None
+
     @abstractmethod
     def next(self, event: Event) -> Transition:
         raise NotImplementedError
@@ -21,11 +29,12 @@ class State(ABC):
 
 
 class WeatherState(State):
+    rejection_message = "No transition"
+
     def next(self, event: Event) -> Transition:
         if event.type == "Weather" and event.value in ["sunny", "rainy"]:
             return Transition(self, MoodState(), event)
         else:
-            print("No transition")
             return Transition(self, self, None)
 
     def run(self) -> Output:
@@ -60,23 +69,43 @@ class TerminalState(State):
         return "TerminalState"
 
 
+def format_record(record: TraceRecord) -> str:
+    """Format a trace record of the state machine the way it used to be printed.
+    A record without a transition marks the end of handling an event."""
+    if record.transition is None:
+        return ""
+    if record.event is None:
+        return f"Move to a {record.transition.target}\n"
+
+    # Run the state to show its output.
+    output = record.state.run()
+    lines = [
+        f"State {output.state} emits {output.value}",
+        f"Received an event of type {record.event.type} with value {record.event.value}",
+    ]
+    if record.transition.event is not None:
+        lines.append(f"Transition from {record.transition.source} to {record.transition.target}")
+    elif record.state.rejection_message is not None:
+        lines.append(record.state.rejection_message)
+    return "\n".join(lines)
+
+
 class StateMachine:
-    def __init__(self):
-        print(f"Move to a WeatherState\n")
+    def __init__(self, sink: Optional[TraceSink] = None):
+        """sink: Where trace records go. By default, they are printed."""
+        self.sink = PrintSink(format_record) if sink is None else sink
         self.state = WeatherState()
         self.parameters = {}
+        trace(self.sink, None, None, Transition(None, self.state, None))
 
     def handle(self, event: Event) -> None:
-        # Run the state and print the output.
-        output = self.state.run()
-        print(f"State {output.state} emits {output.value}")
-
         # Handle the event and perform the transition.
-        print(f"Received an event of type {event.type} with value {event.value}")
         transition = self.state.next(event)
 
+        if self.sink.enabled:
+            self.sink.write(time.perf_counter(), self.state, event, transition)
+
         if transition.event is not None:
-            print(f"Transition from {transition.source} to {transition.target}")
             self.parameters[transition.event.type] = transition.event.value
 
         self.state = transition.target
@@ -88,7 +117,8 @@ class StateMachine:
             mood = self.parameters["Mood"]
             recommend_activity(weather, mood)
 
-        print()
+        if self.sink.enabled:
+            self.sink.write(time.perf_counter(), self.state, None, None)
 
 
 def recommend_activity(weather: str, mood: str) -> None:
@@ -0,0 +1,134 @@
+"""
+An incremental engine for the Petri net in `simple_petrinet.py`.
+
+`fire_transitions` in `simple_petrinet.py` re-checks every transition on every
+step. The engine below keeps an index from each place to the transitions that
+consume from it, and only re-checks those transitions whose input places have
+changed since the last step. The firing semantics are the same: on each step,
+all transitions that are enabled at the start of the step are fired in the
+order they appear in `net.transitions`.
+"""
+import random
+import time
+
+from typing import Dict, List, Set
+
+from simple_petrinet import (
+    PetriNet,
+    Place,
+    Transition,
+    create_transition,
+    fire_transition,
+    fire_transitions,
+    transition_is_enabled,
+)
+
+
+class IndexedEngine:
+    def __init__(self, net: PetriNet):
+        self.net = net
+        self.order: Dict[int, int] = {}
+        self.dependents: Dict[int, List[Transition]] = {}
+        self.enabled: Set[int] = set()
+        self.dirty: Set[int] = set()
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """(Re)build the place -> dependent transitions index from the net."""
+        self.order = {id(t): i for i, t in enumerate(self.net.transitions)}
+        self.dependents = {id(p): [] for p in self.net.places}
+        for t in self.net.transitions:
+            for place in set(map(id, t.input_places)):
+                self.dependents.setdefault(place, []).append(t)
+
+        self.enabled = {id(t) for t in self.net.transitions if transition_is_enabled(t)}
+        self.dirty = set()
+
+    def mark_dirty(self, place: Place) -> None:
+        """Tell the engine that `place.token_count` was changed outside of `step`."""
+        self.dirty.add(id(place))
+
+    def refresh(self) -> None:
+        """Re-check the transitions that depend on the dirty places."""
+        for place in self.dirty:
+            for t in self.dependents.get(place, ()):
+                if transition_is_enabled(t):
+                    self.enabled.add(id(t))
+                else:
+                    self.enabled.discard(id(t))
+        self.dirty.clear()
+
+    def enabled_transitions(self) -> List[Transition]:
+        """Return the enabled transitions in the order of `net.transitions`."""
+        self.refresh()
+        indices = sorted(self.order[t] for t in self.enabled)
+        return [self.net.transitions[i] for i in indices]
+
+    def step(self) -> List[Transition]:
+        """Fire all transitions enabled at the start of the step, like `fire_transitions`."""
+        to_fire = self.enabled_transitions()
+        for transition in to_fire:
+            fire_transition(transition)
+            self.dirty.update(map(id, transition.input_places))
+            self.dirty.update(map(id, transition.output_places))
+        return to_fire
+
+
+def create_synthetic_net(n_chains: int, chain_length: int, seed: int = 0) -> PetriNet:
+    """Create a net made of `n_chains` linear chains whose ends are joined pairwise.
+    Only the first place of every tenth chain holds a token, so a small part
+    of the net is active at any time."""
+    rng = random.Random(seed)
+    net = PetriNet()
+    ends: List[Place] = []
+    for c in range(n_chains):
+        chain = [Place(name=f"P{c}_{i}") for i in range(chain_length + 1)]
+        if c % 10 == 0:
+            chain[0].token_count = 1
+        net.places.extend(chain)
+        ends.append(chain[-1])
+        for i in range(chain_length):
+            net.transitions.append(create_transition(f"T{c}_{i}", [chain[i]], [chain[i + 1]]))
+
+    # Join the ends of pairs of chains so that transitions with several input
+    # places exist. Each end is consumed by one transition only, so no two
+    # transitions compete for the same token.
+    rng.shuffle(ends)
+    for k in range(len(ends) // 2):
+        out = Place(name=f"J{k}")
+        net.places.append(out)
+        net.transitions.append(create_transition(f"J{k}", [ends[2 * k], ends[2 * k + 1]], [out]))
+    return net
+
+
+def main() -> None:
+    n_chains, chain_length, n_steps = 1000, 10, 20
+
+    # Two copies of the same net: one for the baseline, one for the engine.
+    baseline = create_synthetic_net(n_chains, chain_length)
+    indexed = create_synthetic_net(n_chains, chain_length)
+    print(f"Places: {len(baseline.places)}, Transitions: {len(baseline.transitions)}")
+
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        fire_transitions(baseline)
+    elapsed_baseline = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = IndexedEngine(indexed)
+    elapsed_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        engine.step()
+    elapsed_indexed = time.perf_counter() - start
+
+    same = [p.token_count for p in baseline.places] == [p.token_count for p in indexed.places]
+    print(f"fire_transitions: {elapsed_baseline * 1000 / n_steps:.3f} ms/step")
+    print(f"IndexedEngine:    {elapsed_indexed * 1000 / n_steps:.3f} ms/step "
+          f"(index construction: {elapsed_build * 1000:.3f} ms)")
+    print(f"Same markings: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Low-overhead metrics for the nets in `simple_petrinet.py` and `async_petrinet.py`.
+
+`NetMetrics` records, per transition, how often it fired, how long it was
+enabled before it fired (as a histogram and as raw samples), and how long its
+request functions took. Per place, it records the token count over time. Raw
+samples go into preallocated ring buffers, so memory stays fixed however long
+the net runs, and can be exported as NumPy arrays or CSV.
+
+Nothing is recorded until `attach` is called: without attached metrics, the
+only cost left in `fire_transition` is a loop over the transition's empty list
+of hooks. One `NetMetrics` records one net, and `detach` removes everything
+`attach` installed.
+"""
+import asyncio
+import csv
+import math
+import time
+
+from array import array
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+import async_petrinet
+import simple_petrinet
+
+
+class RingBuffer:
+    """A fixed-size buffer of floats that overwrites its oldest values when full."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.values = array("d", bytes(8 * capacity))
+        self.count = 0
+
+    def append(self, value: float) -> None:
+        self.values[self.count % self.capacity] = value
+        self.count += 1
+
+    def to_array(self) -> np.ndarray:
+        """Return the stored values from the oldest to the newest."""
+        values = np.frombuffer(self.values, dtype=np.float64)
+        if self.count <= self.capacity:
+            return values[:self.count].copy()
+        start = self.count % self.capacity
+        return np.concatenate([values[start:], values[:start]])
+
+
+class Histogram:
+    """Counts of values in log-spaced bins from `low` to `high` (seconds)."""
+
+    def __init__(self, low: float = 1e-6, high: float = 100.0, bins_per_decade: int = 4):
+        self.low = low
+        self.bins_per_decade = bins_per_decade
+        n_bins = int(math.ceil(math.log10(high / low) * bins_per_decade)) + 2
+        self.counts = array("q", bytes(8 * n_bins))
+
+    def add(self, value: float) -> None:
+        if value < self.low:
+            index = 0
+        else:
+            index = min(len(self.counts) - 1, 1 + int(math.log10(value / self.low) * self.bins_per_decade))
+        self.counts[index] += 1
+
+    def edges(self) -> np.ndarray:
+        """The upper edges of the bins; the last bin holds everything above."""
+        exponents = np.arange(len(self.counts)) / self.bins_per_decade
+        return self.low * 10 ** exponents
+
+
+def _token_count(place) -> int:
+    if isinstance(place, simple_petrinet.Place):
+        return place.token_count
+    return len(place.tokens)
+
+
+class NetMetrics:
+    def __init__(self, capacity: int = 4096, clock: Callable[[], float] = time.perf_counter):
+        """
+        capacity: The number of samples each ring buffer holds.
+        clock: The time source, e.g. the virtual clock of a simulation.
+        """
+        self.capacity = capacity
+        self.clock = clock
+        self.fire_counts: Dict[str, int] = {}
+        self.fire_latencies: Dict[str, RingBuffer] = {}
+        self.fire_histograms: Dict[str, Histogram] = {}
+        self.request_durations: Dict[str, RingBuffer] = {}
+        self.occupancy: Dict[str, Tuple[RingBuffer, RingBuffer]] = {}
+
+        self._dependents: Dict[int, List] = {}
+        self._enabled_since: Dict[int, float] = {}
+        self._disabled_since: Dict[int, float] = {}
+        self.net = None
+        self._undo: List[Callable[[], None]] = []  # Reverts what `attach` installed
+
+    def attach(self, net) -> None:
+        """Start recording the places and transitions of `net`."""
+        if self.net is not None:
+            raise ValueError("NetMetrics is already attached to a net; use one NetMetrics per net")
+        for kind, items in (("place", net.places), ("transition", net.transitions)):
+            names = [item.name for item in items]
+            if len(set(names)) != len(names):
+                raise ValueError(f"The net has several {kind}s with the same name; metrics are keyed by name")
+        self.net = net
+        now = self.clock()
+        for place in net.places:
+            self.occupancy[place.name] = (RingBuffer(self.capacity), RingBuffer(self.capacity))
+            self._dependents[id(place)] = []
+        for t in net.transitions:
+            self.fire_counts[t.name] = 0
+            self.fire_latencies[t.name] = RingBuffer(self.capacity)
+            self.fire_histograms[t.name] = Histogram()
+            for place in t.input_places:
+                self._dependents[id(place)].append(t)
+            if self._is_enabled(t):
+                self._enabled_since[id(t)] = now
+        for place in net.places:
+            self._record_occupancy(place, now)
+
+        if isinstance(net, simple_petrinet.PetriNet):
+            # Token counts of the simple net only change when a transition fires.
+            def hook(t):
+                for place in t.input_places + t.output_places:
+                    self.on_tokens_changed(place)
+                self.on_fire(t)
+
+            for t in net.transitions:
+                self._add(t.fire_hooks, hook)
+        else:
+            def listener(place, delta):
+                self.on_tokens_changed(place)
+
+            for place in net.places:
+                self._add(place.listeners, listener)
+            for t in net.transitions:
+                self._add(t.fire_hooks, self.on_fire)
+                self._instrument_requests(t)
+
+    def detach(self) -> None:
+        """Stop recording: remove the hooks and listeners and restore the request functions."""
+        for undo in reversed(self._undo):
+            undo()
+        self._undo.clear()
+        self.net = None
+
+    def on_tokens_changed(self, place) -> None:
+        now = self.clock()
+        self._record_occupancy(place, now)
+        for t in self._dependents.get(id(place), ()):
+            if self._is_enabled(t):
+                if id(t) not in self._enabled_since:
+                    self._enabled_since[id(t)] = now
+                    self._disabled_since.pop(id(t), None)
+            elif id(t) in self._enabled_since:
+                # Keep the time, in case this change is `t` firing.
+                self._disabled_since[id(t)] = self._enabled_since.pop(id(t))
+
+    def on_fire(self, t) -> None:
+        now = self.clock()
+        since = self._disabled_since.pop(id(t), None)
+        if since is None:
+            since = self._enabled_since.get(id(t), now)
+        if id(t) in self._enabled_since:
+            # Still enabled after firing: the next firing waits from now on.
+            self._enabled_since[id(t)] = now
+
+        self.fire_counts[t.name] += 1
+        self.fire_latencies[t.name].append(now - since)
+        self.fire_histograms[t.name].add(now - since)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Export the recorded samples as arrays keyed by `<kind>/<name>`."""
+        arrays: Dict[str, np.ndarray] = {}
+        for name, buffer in self.fire_latencies.items():
+            arrays[f"fire_latency/{name}"] = buffer.to_array()
+        for name, buffer in self.request_durations.items():
+            arrays[f"request_duration/{name}"] = buffer.to_array()
+        for name, (times, counts) in self.occupancy.items():
+            arrays[f"occupancy/{name}"] = np.stack([times.to_array(), counts.to_array()], axis=1)
+        return arrays
+
+    def to_csv(self, path: str) -> None:
+        """Write all samples to a CSV file with the columns kind, name, time, value."""
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["kind", "name", "time", "value"])
+            for key, values in self.to_arrays().items():
+                kind, name = key.split("/", 1)
+                if kind == "occupancy":
+                    writer.writerows((kind, name, t, int(count)) for t, count in values)
+                else:
+                    writer.writerows((kind, name, "", value) for value in values)
+
+    def print_summary(self) -> None:
+        print("========================================")
+        print("Transitions:")
+        for name, count in self.fire_counts.items():
+            latencies = self.fire_latencies[name].to_array()
+            mean = latencies.mean() * 1000 if len(latencies) else 0.0
+            print(f"  {name}: fired {count} times, mean enable-to-fire latency {mean:.3f} ms")
+        for name, buffer in self.request_durations.items():
+            durations = buffer.to_array()
+            if len(durations):
+                print(f"  {name} requests: {len(durations)}, mean duration {durations.mean() * 1000:.3f} ms")
+        print("Places (max tokens):")
+        print("  ", end="")
+        for name, (_, counts) in self.occupancy.items():
+            print(f"{name}: {int(counts.to_array().max())}", end=", ")
+        print()
+
+    def _is_enabled(self, t) -> bool:
+        return all(_token_count(place) > 0 for place in t.input_places)
+
+    def _record_occupancy(self, place, now: float) -> None:
+        if place.name in self.occupancy:
+            times, counts = self.occupancy[place.name]
+            times.append(now)
+            counts.append(_token_count(place))
+
+    def _add(self, callbacks: list, callback: Callable) -> None:
+        callbacks.append(callback)
+        self._undo.append(lambda: callbacks.remove(callback))
+
+    def _instrument_requests(self, t) -> None:
+        """Wrap the request functions of `t` so that their durations are recorded."""
+        if not t.request_funcs:
+            return
+        buffer = self.request_durations.setdefault(t.name, RingBuffer(self.capacity))
+
+        def timed(func):
+            async def run():
+                start = self.clock()
+                try:
+                    await func()
+                finally:
+                    buffer.append(self.clock() - start)
+
+            return run
+
+        request_funcs, request_places = t.request_funcs, t.request_places
+        wrapped = {func: timed(func) for func in request_funcs}
+        t.request_funcs = set(wrapped.values())
+        t.request_places = {wrapped.get(func, func): places for func, places in request_places.items()}
+
+        def restore():
+            t.request_funcs, t.request_places = request_funcs, request_places
+
+        self._undo.append(restore)
+
+
+def main() -> None:
+    from indexed_petrinet import create_synthetic_net
+
+    n_steps = 20
+
+    # Overhead on a large simple net, without and with metrics.
+    net = create_synthetic_net(1000, 10)
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        simple_petrinet.fire_transitions(net)
+    elapsed_disabled = time.perf_counter() - start
+
+    net = create_synthetic_net(1000, 10)
+    metrics = NetMetrics()
+    metrics.attach(net)
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        simple_petrinet.fire_transitions(net)
+    elapsed_enabled = time.perf_counter() - start
+    metrics.detach()
+    fired = sum(metrics.fire_counts.values())
+
+    print(f"Transitions fired: {fired}")
+    print(f"fire_transitions without metrics: {elapsed_disabled * 1000 / n_steps:.3f} ms/step")
+    print(f"fire_transitions with metrics:    {elapsed_enabled * 1000 / n_steps:.3f} ms/step")
+
+    # An async net whose requests answer quickly.
+    async def run_async():
+        p_init = async_petrinet.Place(name="Init")
+        p_req = async_petrinet.Place(name="Req")
+        p_end = async_petrinet.Place(name="End")
+        t_start = async_petrinet.Transition("Start", [p_init], [p_req])
+        t_res = async_petrinet.Transition("Res", [p_req], [p_end])
+
+        async def observer(value: str) -> None:
+            await async_petrinet.fire_transition(t_res, value=value)
+
+        async def request():
+            await asyncio.sleep(0.01)
+            await observer("done")
+
+        t_res.observer_func = observer
+        t_start.request_funcs.add(request)
+
+        net = async_petrinet.PetriNet()
+        net.places = [p_init, p_req, p_end]
+        net.transitions = [t_start, t_res]
+
+        metrics = NetMetrics()
+        metrics.attach(net)
+        for _ in range(10):
+            p_init.create_token()
+        scheduler = async_petrinet.Scheduler(net, terminal_places=[])
+        scheduler_task = asyncio.create_task(scheduler.run())
+        while len(p_end.tokens) < 10:
+            await asyncio.sleep(0.01)
+        scheduler_task.cancel()
+        metrics.detach()
+        return metrics
+
+    metrics = asyncio.run(run_async())
+    metrics.print_summary()
+    print(f"Occupancy of Req (time, tokens):\n{metrics.to_arrays()['occupancy/Req'][:5]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Persistent frames with many slots for the frame-based agent in `frame.py`.
+
+A `PersistentFrame` stores its slot values in fixed-size chunks (tuples),
+referenced from a top-level tuple. Updating a few slots copies only the chunks
+that contain them and the top-level tuple; all other chunks are shared with
+the previous frame. Frames are never modified in place, so sharing is safe and
+the value semantics of `update_frame` are kept without `copy.deepcopy`.
+"""
+import copy
+import time
+
+from dataclasses import make_dataclass, replace
+from typing import Any, Dict, Mapping, Tuple
+
+
+class PersistentFrame:
+    """Subclasses set `slot_names`. Slots that are not given default to None."""
+
+    __slots__ = ("_chunks",)
+    slot_names: Tuple[str, ...] = ()
+    chunk_size = 8
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._index = {name: divmod(i, cls.chunk_size) for i, name in enumerate(cls.slot_names)}
+        for name, (c, i) in cls._index.items():
+            setattr(cls, name, property(lambda self, c=c, i=i: self._chunks[c][i]))
+
+    def __init__(self, **values: Any):
+        flat = [values.pop(name, None) for name in self.slot_names]
+        if values:
+            raise TypeError(f"Unknown slots: {', '.join(values)}")
+        size = self.chunk_size
+        self._chunks = tuple(tuple(flat[i:i + size]) for i in range(0, len(flat), size))
+
+    def update(self, changes: Mapping[str, Any]) -> "PersistentFrame":
+        """Return a frame with the given slots replaced; values that are None are ignored."""
+        by_chunk: Dict[int, list] = {}
+        for name, value in changes.items():
+            if value is None:
+                continue
+            c, i = self._index[name]
+            if self._chunks[c][i] is value:
+                continue
+            if c not in by_chunk:
+                by_chunk[c] = list(self._chunks[c])
+            by_chunk[c][i] = value
+        if not by_chunk:
+            return self
+
+        chunks = list(self._chunks)
+        for c, chunk in by_chunk.items():
+            chunks[c] = tuple(chunk)
+        frame = object.__new__(type(self))
+        frame._chunks = tuple(chunks)
+        return frame
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.slot_names}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._chunks == other._chunks
+
+    def __hash__(self):
+        return hash(self._chunks)
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={value!r}" for name, value in self.to_dict().items())
+        return f"{type(self).__name__}({values})"
+
+    def __setattr__(self, name, value):
+        if name != "_chunks" or hasattr(self, "_chunks"):
+            raise AttributeError(f"{type(self).__name__} is immutable")
+        object.__setattr__(self, name, value)
+
+
+def main() -> None:
+    n_slots, n_updates = 48, 100_000
+    slot_names = tuple(f"slot{i}" for i in range(n_slots))
+
+    # The frame of `frame.py` with many slots, each holding a nested value.
+    MutableFrame = make_dataclass("MutableFrame", [(name, Any, None) for name in slot_names])
+    FrozenFrame = make_dataclass(
+        "FrozenFrame", [(name, Any, None) for name in slot_names], frozen=True, slots=True,
+    )
+
+    LargeFrame = type("LargeFrame", (PersistentFrame,), {"__slots__": (), "slot_names": slot_names})
+
+    initial = {name: ("value", i) for i, name in enumerate(slot_names)}
+    events = [{f"slot{i % n_slots}": ("new", i), f"slot{(7 * i) % n_slots}": None} for i in range(n_updates)]
+
+    def update_deepcopy(event, frame):
+        frame = copy.deepcopy(frame)
+        for name, value in event.items():
+            if value is not None:
+                setattr(frame, name, value)
+        return frame
+
+    def update_replace(event, frame):
+        return replace(frame, **{name: value for name, value in event.items() if value is not None})
+
+    def update_persistent(event, frame):
+        return frame.update(event)
+
+    results = {}
+    for name, update, frame in [
+        ("deepcopy", update_deepcopy, MutableFrame(**initial)),
+        ("dataclasses.replace", update_replace, FrozenFrame(**initial)),
+        ("PersistentFrame", update_persistent, LargeFrame(**initial)),
+    ]:
+        n = n_updates // 10 if name == "deepcopy" else n_updates
+        start = time.perf_counter()
+        for event in events[:n]:
+            frame = update(event, frame)
+        results[name] = ((time.perf_counter() - start) * 1e6 / n, frame)
+
+    print(f"Slots: {n_slots}, one slot changed per update")
+    for name, (us_per_update, _) in results.items():
+        print(f"{name + ':':21}{us_per_update:.2f} us/update")
+
+    # The deepcopy version ran fewer updates; replay those on a persistent frame.
+    check = LargeFrame(**initial)
+    for event in events[:n_updates // 10]:
+        check = check.update(event)
+    print(f"Same values: {vars(results['deepcopy'][1]) == check.to_dict()}")
+
+
+if __name__ == "__main__":
+    main()
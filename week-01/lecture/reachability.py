@@ -0,0 +1,270 @@
+"""
+Reachability and coverability analysis for the Petri net in `simple_petrinet.py`.
+
+Unlike `fire_transitions`, which fires every enabled transition in one step,
+the explorer below fires one transition at a time and so visits every
+interleaving. Each marking is stored once, packed into a bytes object (one byte
+per place while all counts are below 255), and numbered; its parent, token
+total and smallest ancestor total are kept in integer arrays indexed by that
+number. This takes about 200 bytes per marking of 60 places, a third of a
+tuple-keyed dict. When a new marking strictly covers one of its ancestors, the places that
+grew can grow without bound, and their counts are replaced by OMEGA
+(Karp-Miller construction). This keeps the state space finite for unbounded
+nets too.
+"""
+import time
+
+from array import array
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from simple_petrinet import PetriNet, Place, create_transition
+
+# Token count of a place that can hold arbitrarily many tokens.
+OMEGA = 2 ** 62
+
+Marking = Tuple[int, ...]
+
+
+@dataclass
+class ReachabilityResult:
+    place_names: List[str]
+    n_markings: int = 0
+    n_edges: int = 0
+    complete: bool = True
+    unbounded_places: List[str] = field(default_factory=list)
+    unmarked_places: List[str] = field(default_factory=list)
+    deadlocks: List[Marking] = field(default_factory=list)
+    terminal_markings: List[Marking] = field(default_factory=list)
+
+    @property
+    def bounded(self) -> bool:
+        return not self.unbounded_places
+
+    def to_dict(self, marking: Marking) -> Dict[str, object]:
+        """Convert a marking into a {place name: token count} dict."""
+        return {
+            name: "ω" if count == OMEGA else count
+            for name, count in zip(self.place_names, marking)
+        }
+
+
+def get_marking(net: PetriNet) -> Marking:
+    return tuple(place.token_count for place in net.places)
+
+
+def _compile(net: PetriNet) -> List[Tuple[Tuple[Tuple[int, int], ...], Tuple[Tuple[int, int], ...]]]:
+    """Turn each transition into (consumed, delta) lists of (place index, count) pairs."""
+    index = {id(place): i for i, place in enumerate(net.places)}
+    compiled = []
+    for transition in net.transitions:
+        pre: Dict[int, int] = {}
+        delta: Dict[int, int] = {}
+        for place in transition.input_places:
+            pre[index[id(place)]] = pre.get(index[id(place)], 0) + 1
+            delta[index[id(place)]] = delta.get(index[id(place)], 0) - 1
+        for place in transition.output_places:
+            delta[index[id(place)]] = delta.get(index[id(place)], 0) + 1
+        compiled.append((
+            tuple(pre.items()),
+            tuple((p, d) for p, d in delta.items() if d != 0),
+        ))
+    return compiled
+
+
+def _pack(m: Marking) -> bytes:
+    """One byte per place (OMEGA as 255) if all counts fit, otherwise eight.
+    The two encodings have different lengths, so equal markings always pack
+    to equal bytes."""
+    if all(count < 255 or count == OMEGA for count in m):
+        return bytes(255 if count == OMEGA else count for count in m)
+    return array("q", m).tobytes()
+
+
+def _unpack(packed: bytes, n_places: int) -> Marking:
+    if len(packed) == n_places:
+        return tuple(OMEGA if count == 255 else count for count in packed)
+    return tuple(array("q", packed))
+
+
+def _weight(m: Marking) -> int:
+    """The number of OMEGA places times 2^32 plus the other token counts. If m
+    strictly covers an ancestor, its weight is larger, and unlike the plain sum
+    of the counts, the weight fits in 64 bits."""
+    n_omega = sum(count == OMEGA for count in m)
+    return (n_omega << 32) + sum(count for count in m if count != OMEGA)
+
+
+def _covers_strictly(m: Sequence[int], ancestor: Sequence[int]) -> bool:
+    """Whether m >= ancestor in every place and > in at least one. Compares
+    element-wise, so a list and a tuple with the same counts are equal."""
+    return all(a <= b for a, b in zip(ancestor, m)) and any(a < b for a, b in zip(ancestor, m))
+
+
+def explore(
+        net: PetriNet,
+        terminal_places: Iterable[str] = ("End",),
+        initial: Optional[Marking] = None,
+        max_markings: int = 5_000_000,
+        depth_first: bool = False,
+) -> ReachabilityResult:
+    """Explore all markings reachable from `initial` (the current marking of `net` by default).
+
+    A marking without enabled transitions is reported as a terminal marking if
+    it puts a token in one of `terminal_places`, and as a deadlock otherwise.
+    At most `max_markings` markings are stored (about 1 GB for 60 places at
+    the default); if the limit is reached, `complete` is set to False.
+    """
+    transitions = _compile(net)
+    # Only transitions that consume from a marked place, or from no place at
+    # all, can be enabled.
+    dependents: List[List[int]] = [[] for _ in net.places]
+    sources = set()
+    for t, (pre, _) in enumerate(transitions):
+        for p, _ in pre:
+            dependents[p].append(t)
+        if not pre:
+            sources.add(t)
+    place_names = [place.name for place in net.places]
+    terminal_set = set(terminal_places)
+    terminal = [i for i, name in enumerate(place_names) if name in terminal_set]
+    result = ReachabilityResult(place_names=place_names)
+    n_places = len(place_names)
+
+    start = get_marking(net) if initial is None else tuple(initial)
+    # Markings are numbered in the order they are found. For each, we keep its
+    # parent, so that ancestors can be checked for coverage, its weight, and the
+    # smallest weight among itself and its ancestors. A marking can only strictly
+    # cover an ancestor with a smaller weight, so the walk over the ancestors is
+    # skipped when no such ancestor exists.
+    index: Dict[bytes, int] = {_pack(start): 0}
+    packed: List[bytes] = list(index)
+    parents = array("q", [-1])
+    totals = array("q", [_weight(start)])
+    min_totals = array("q", [_weight(start)])
+    frontier = deque([0])
+    pop = frontier.pop if depth_first else frontier.popleft
+    ever_marked = [count > 0 for count in start]
+    unbounded = [False] * len(start)
+
+    while frontier:
+        i = pop()
+        m = _unpack(packed[i], n_places)
+        is_dead = True
+        candidates = sources.union(t for p, count in enumerate(m) if count for t in dependents[p])
+        for t in sorted(candidates):
+            pre, delta = transitions[t]
+            if any(m[p] < n for p, n in pre):
+                continue
+            is_dead = False
+            result.n_edges += 1
+
+            total, min_total = totals[i], min_totals[i]
+            successor = list(m)
+            for p, d in delta:
+                if successor[p] != OMEGA:
+                    successor[p] += d
+                    total += d
+
+            # Karp-Miller acceleration: compare against ancestors on the path.
+            a = i if total > min_total else -1
+            while a >= 0:
+                ancestor = m if a == i else _unpack(packed[a], n_places)
+                if _covers_strictly(successor, ancestor):
+                    for p, (before, after) in enumerate(zip(ancestor, successor)):
+                        if after > before:
+                            successor[p] = OMEGA
+                            unbounded[p] = True
+                    total = _weight(successor)
+                a = parents[a]
+
+            key = _pack(successor)
+            if key in index:
+                continue
+            if len(packed) >= max_markings:
+                result.complete = False
+                continue
+            index[key] = len(packed)
+            frontier.append(len(packed))
+            packed.append(key)
+            parents.append(i)
+            totals.append(total)
+            min_totals.append(min(min_total, total))
+            for p, d in delta:
+                if d > 0:
+                    ever_marked[p] = True
+
+        if is_dead:
+            if any(m[p] > 0 for p in terminal):
+                result.terminal_markings.append(m)
+            else:
+                result.deadlocks.append(m)
+
+    result.n_markings = len(packed)
+    result.unbounded_places = [name for name, u in zip(place_names, unbounded) if u]
+    result.unmarked_places = [name for name, marked in zip(place_names, ever_marked) if not marked]
+    return result
+
+
+def print_result(result: ReachabilityResult) -> None:
+    print("========================================")
+    print(f"Markings: {result.n_markings}, Edges: {result.n_edges}, Complete: {result.complete}")
+    print(f"Bounded: {result.bounded}", end="")
+    if not result.bounded:
+        print(f" (unbounded places: {', '.join(result.unbounded_places)})", end="")
+    print()
+    if result.unmarked_places:
+        print(f"Never marked: {', '.join(result.unmarked_places)}")
+    print(f"Terminal markings: {len(result.terminal_markings)}")
+    for m in result.terminal_markings[:2]:
+        print(f"  {result.to_dict(m)}")
+    print(f"Deadlocks: {len(result.deadlocks)}")
+    for m in result.deadlocks[:2]:
+        print(f"  {result.to_dict(m)}")
+
+
+def main() -> None:
+    # The conversation net from `simple_petrinet.py`.
+    net = PetriNet()
+    p_init = Place(name="Init", token_count=1)
+    p_req_user = Place(name="ReqUser")
+    p_user_res_ready = Place(name="UserResReady")
+    p_req_api = Place(name="ReqAPI")
+    p_api_res_ready = Place(name="APIResReady")
+    p_end = Place(name="End")
+    net.places.extend([p_init, p_req_user, p_user_res_ready, p_req_api, p_api_res_ready, p_end])
+    net.transitions.extend([
+        create_transition("StartConv", [p_init], [p_req_user, p_req_api]),
+        create_transition("ResUser", [p_req_user], [p_user_res_ready]),
+        create_transition("ResAPI", [p_req_api], [p_api_res_ready]),
+        create_transition("CombineRes", [p_user_res_ready, p_api_res_ready], [p_end]),
+    ])
+    print_result(explore(net))
+
+    # A user that can keep asking again produces unboundedly many API requests,
+    # and a timeout that drops the user request deadlocks the conversation.
+    net.transitions.extend([
+        create_transition("AskAgain", [p_user_res_ready], [p_req_user, p_req_api]),
+        create_transition("Timeout", [p_req_user], []),
+    ])
+    print_result(explore(net))
+
+    # A larger net: independent chains interleave into a product state space.
+    n_chains, chain_length = 6, 9
+    net = PetriNet()
+    for c in range(n_chains):
+        chain = [Place(name=f"P{c}_{i}", token_count=int(i == 0)) for i in range(chain_length + 1)]
+        net.places.extend(chain)
+        for i in range(chain_length):
+            net.transitions.append(create_transition(f"T{c}_{i}", [chain[i]], [chain[i + 1]]))
+
+    start = time.perf_counter()
+    result = explore(net, terminal_places=[f"P{c}_{chain_length}" for c in range(n_chains)])
+    elapsed = time.perf_counter() - start
+    print_result(result)
+    print(f"Explored {result.n_markings} markings in {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+An executor for the request functions of the transitions in `async_petrinet.py`.
+
+`fire_transition` used to start a task for every request function and drop the
+reference to it, so nothing limited how many requests were in flight, and
+exceptions were lost. The executor below keeps a reference to every task,
+limits the number of concurrently running requests globally and per
+transition, applies a timeout, and cancels outstanding requests once the
+tokens they were started for have been consumed by some other transition than
+the one that handles their response.
+"""
+import asyncio
+
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+
+@dataclass
+class ExecutorStats:
+    submitted: int = 0
+    queued: int = 0
+    running: int = 0
+    completed: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    timed_out: int = 0
+    max_queued: int = 0
+
+
+class RequestExecutor:
+    def __init__(
+            self,
+            max_concurrency: int = 100,
+            max_concurrency_per_transition: int = 10,
+            max_queued: Optional[int] = None,
+            timeout: Optional[float] = None,
+    ):
+        """
+        max_concurrency: The maximum number of requests running at the same time.
+        max_concurrency_per_transition: The same, for the requests of a single transition.
+        max_queued: If set, `submit` waits while this many requests are waiting to run.
+        timeout: If set, requests running longer than this many seconds are cancelled.
+        """
+        self.max_concurrency_per_transition = max_concurrency_per_transition
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.stats = ExecutorStats()
+        self.tasks: Set[asyncio.Task] = set()
+        # The exceptions of failed requests, in the order they failed.
+        self.failures: List[BaseException] = []
+
+        self._global_limit = asyncio.Semaphore(max_concurrency)
+        self._transition_limits: Dict[str, asyncio.Semaphore] = {}
+        self._queued_by_transition: Dict[str, int] = {}
+        # One slot per queued request; released when it starts running or is
+        # done, including when it is cancelled before it starts.
+        self._queue_slots = None if max_queued is None else asyncio.Semaphore(max_queued)
+        self._watchers: Dict[int, Set[asyncio.Task]] = {}
+        self._watched_places: Dict[asyncio.Task, List] = {}
+        self._waiting: Dict[asyncio.Task, str] = {}
+
+    def queue_depth(self, transition_name: Optional[str] = None) -> int:
+        """The number of requests waiting to run, in total or for one transition."""
+        if transition_name is None:
+            return self.stats.queued
+        return self._queued_by_transition.get(transition_name, 0)
+
+    async def submit(
+            self,
+            transition_name: str,
+            func: Callable[[], Awaitable],
+            places: Optional[List] = None,
+    ) -> asyncio.Task:
+        """Schedule `func()` as a request of the transition `transition_name`.
+
+        `places` are the places holding the tokens the request was started for.
+        See `cancel_requests`.
+        """
+        if self._queue_slots is not None:
+            await self._queue_slots.acquire()
+
+        self.stats.submitted += 1
+        self._queued(transition_name, 1)
+        task = asyncio.create_task(self._run(transition_name, func))
+        self._waiting[task] = transition_name
+        self.tasks.add(task)
+        task.add_done_callback(self._on_done)
+
+        self._watched_places[task] = places or []
+        for place in self._watched_places[task]:
+            self._watchers.setdefault(id(place), set()).add(task)
+        return task
+
+    def cancel_requests(self, places: List) -> None:
+        """Cancel the outstanding requests started for tokens in `places` if they
+        are now empty. `fire_transition` calls this when a transition without an
+        observer function consumes tokens, since then no response is awaited anymore."""
+        for place in places:
+            if len(place.tokens) > 0:
+                continue
+            for task in list(self._watchers.get(id(place), ())):
+                if not task.done():
+                    task.cancel()
+
+    async def join(self) -> None:
+        """Wait until all submitted requests are finished."""
+        while self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def cancel_all(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+
+    async def _run(self, transition_name: str, func: Callable[[], Awaitable]) -> None:
+        if transition_name not in self._transition_limits:
+            self._transition_limits[transition_name] = asyncio.Semaphore(self.max_concurrency_per_transition)
+
+        async with self._transition_limits[transition_name], self._global_limit:
+            self._dequeue(asyncio.current_task())
+            self.stats.running += 1
+            try:
+                await asyncio.wait_for(func(), self.timeout)
+            finally:
+                self.stats.running -= 1
+
+    def _queued(self, transition_name: str, delta: int) -> None:
+        self.stats.queued += delta
+        self.stats.max_queued = max(self.stats.max_queued, self.stats.queued)
+        self._queued_by_transition[transition_name] = self._queued_by_transition.get(transition_name, 0) + delta
+
+    def _dequeue(self, task: asyncio.Task) -> None:
+        """Remove a task from the queue once it starts running or is done."""
+        if task not in self._waiting:
+            return
+        self._queued(self._waiting.pop(task), -1)
+        if self._queue_slots is not None:
+            self._queue_slots.release()
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        # A task cancelled before it started never ran `_run`.
+        self._dequeue(task)
+        self.tasks.discard(task)
+        for place in self._watched_places.pop(task):
+            self._watchers[id(place)].discard(task)
+
+        if task.cancelled():
+            self.stats.cancelled += 1
+        elif isinstance(task.exception(), asyncio.TimeoutError):
+            self.stats.timed_out += 1
+        elif task.exception() is not None:
+            self.stats.failed += 1
+            self.failures.append(task.exception())
+            print(f"[Executor] Request failed: {task.exception()!r}")
+        else:
+            self.stats.completed += 1
@@ -0,0 +1,182 @@
+"""
+Hosting many conversations from `async_petrinet.py` in one event loop.
+
+Each session gets its own copy of the conversation net and its own scheduler.
+The user and the weather API are shared by all sessions, so their responses
+are routed back to the observer of the right session by the session id,
+instead of being broadcast to every attached observer.
+"""
+import asyncio
+import random
+import statistics
+import time
+import tracemalloc
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+from async_petrinet import PetriNet, Place, Scheduler, Transition, fire_transition, transition_is_enabled
+from request_executor import RequestExecutor
+
+
+class Router:
+    """Deliver notifications to the observer attached for a session id."""
+
+    def __init__(self):
+        self.observers: Dict[int, Callable] = {}
+
+    def attach(self, session_id: int, observer: Callable) -> None:
+        self.observers[session_id] = observer
+
+    def detach(self, session_id: int) -> None:
+        self.observers.pop(session_id, None)
+
+    async def notify(self, session_id: int, value: str) -> None:
+        observer = self.observers.get(session_id)
+        if observer is not None:
+            await observer(value)
+
+
+class SessionUser(Router):
+    def __init__(self, delay: Callable[[], float]):
+        super().__init__()
+        self.delay = delay
+
+    async def respond_mood(self, session_id: int, mood: str) -> None:
+        await asyncio.sleep(self.delay())
+        await self.notify(session_id, mood)
+
+
+class SessionWeatherAPI(Router):
+    def __init__(self, delay: Callable[[], float]):
+        super().__init__()
+        self.delay = delay
+
+    async def respond_weather(self, session_id: int, weather: str) -> None:
+        await asyncio.sleep(self.delay())
+        await self.notify(session_id, weather)
+
+
+def create_observer(t: Transition):
+    async def observer(value: str) -> None:
+        if not transition_is_enabled(t):
+            return
+        await fire_transition(t, value=value)
+
+    return observer
+
+
+@dataclass
+class Session:
+    session_id: int
+    net: PetriNet
+    scheduler: Scheduler
+
+
+@dataclass
+class SessionManager:
+    user: SessionUser
+    api: SessionWeatherAPI
+    executor: RequestExecutor
+    sessions: Dict[int, Session] = field(default_factory=dict)
+    tasks: Dict[int, asyncio.Task] = field(default_factory=dict)
+    latencies: List[float] = field(default_factory=list)
+    completed: int = 0
+
+    def create_session(self, session_id: int) -> Session:
+        """Create the conversation net of `async_petrinet.main` for one session."""
+        p_init = Place(name="Init")
+        p_req_user = Place(name="ReqUser")
+        p_user_res_ready = Place(name="UserResReady")
+        p_req_api = Place(name="ReqAPI")
+        p_api_res_ready = Place(name="APIResReady")
+        p_end = Place(name="End")
+
+        t_start_conv = Transition("StartConv", [p_init], [p_req_user, p_req_api], executor=self.executor)
+        t_res_user = Transition("ResUser", [p_req_user], [p_user_res_ready], executor=self.executor)
+        t_res_api = Transition("ResAPI", [p_req_api], [p_api_res_ready], executor=self.executor)
+        t_end_conv = Transition("EndConv", [p_user_res_ready, p_api_res_ready], [p_end], executor=self.executor)
+
+        t_res_user.observer_func = create_observer(t_res_user)
+        t_res_api.observer_func = create_observer(t_res_api)
+        self.user.attach(session_id, t_res_user.observer_func)
+        self.api.attach(session_id, t_res_api.observer_func)
+
+        def request_user():
+            return self.user.respond_mood(session_id, "chill")
+
+        def request_api():
+            return self.api.respond_weather(session_id, "sunny")
+
+        t_start_conv.request_funcs.update([request_user, request_api])
+        t_start_conv.request_places[request_user] = [p_req_user]
+        t_start_conv.request_places[request_api] = [p_req_api]
+
+        net = PetriNet()
+        net.places = [p_init, p_req_user, p_user_res_ready, p_req_api, p_api_res_ready, p_end]
+        net.transitions = [t_start_conv, t_res_user, t_res_api, t_end_conv]
+
+        session = Session(session_id, net, Scheduler(net, [p_end], latencies=self.latencies))
+        self.sessions[session_id] = session
+        return session
+
+    def start(self, session_id: int) -> None:
+        session = self.sessions[session_id]
+        session.net.places[0].create_token()
+        self.tasks[session_id] = asyncio.create_task(self._run(session))
+
+    async def _run(self, session: Session) -> None:
+        try:
+            await session.scheduler.run()
+            self.completed += 1
+        finally:
+            self.user.detach(session.session_id)
+            self.api.detach(session.session_id)
+            self.sessions.pop(session.session_id, None)
+            self.tasks.pop(session.session_id, None)
+
+    async def join(self) -> None:
+        while self.tasks:
+            await asyncio.gather(*self.tasks.values())
+        await self.executor.join()
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def main():
+    n_sessions, batch_size, arrival_interval = 10_000, 100, 0.02
+    rng = random.Random(0)
+    manager = SessionManager(
+        user=SessionUser(delay=lambda: rng.uniform(0.5, 2.0)),
+        api=SessionWeatherAPI(delay=lambda: rng.uniform(0.1, 0.5)),
+        executor=RequestExecutor(max_concurrency=2 * n_sessions, max_concurrency_per_transition=2 * n_sessions),
+    )
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for session_id in range(n_sessions):
+        manager.create_session(session_id)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Sessions arrive in batches over about two seconds.
+    start = time.perf_counter()
+    for session_id in range(n_sessions):
+        manager.start(session_id)
+        if session_id % batch_size == batch_size - 1:
+            await asyncio.sleep(arrival_interval)
+    await manager.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"Sessions: {n_sessions}, Completed: {manager.completed}, Wall time: {elapsed:.2f} s")
+    print(f"Memory per session: {(after - before) / n_sessions / 1024:.2f} KiB")
+    print(f"Step latency: p50 {statistics.median(manager.latencies) * 1000:.3f} ms, "
+          f"p99 {percentile(manager.latencies, 0.99) * 1000:.3f} ms")
+    print(f"Requests: {manager.executor.stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
+from typing import Callable, List
 
 
 @dataclass
@@ -13,6 +13,8 @@ class Transition:
     name: str
     input_places: List[Place]
     output_places: List[Place]
+    # Functions called with the transition right after it fired (see `metrics.py`).
+    fire_hooks: List[Callable[["Transition"], None]] = field(default_factory=list, repr=False, compare=False)
 
 
 class PetriNet:
@@ -40,6 +42,8 @@ def fire_transition(t: Transition) -> None:
         place.token_count -= 1
     for place in t.output_places:
         place.token_count += 1
+    for hook in t.fire_hooks:
+        hook(t)
 
 
 def fire_transitions(net: PetriNet) -> None:
@@ -0,0 +1,229 @@
+"""
+A discrete-event simulation of the nets in `async_petrinet.py` on a virtual clock.
+
+Instead of waiting for `asyncio.sleep` in `User.respond_mood` and
+`WeatherAPI.respond_weather`, the time each response takes is drawn from a
+service-time distribution, and the response is put on a heap of future events.
+The clock then jumps straight to the next event. Transitions with an observer
+function fire when their response arrives, all other transitions fire as soon
+as they are enabled, like in `Scheduler`.
+
+Each backend (one per observer transition name) serves a limited number of
+requests at a time, so queueing delays under load show up in the statistics.
+"""
+import heapq
+import itertools
+import random
+import statistics
+import time
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Tuple
+
+from async_petrinet import PetriNet, Place, Transition, transition_is_enabled
+
+
+@dataclass
+class Backend:
+    service_time: Callable[[random.Random], float]
+    servers: int = 1
+    busy: int = 0
+    queue: Deque[Tuple[float, "Conversation", Transition]] = field(default_factory=deque)
+    busy_time: float = 0.0
+    waits: List[float] = field(default_factory=list)
+
+
+@dataclass
+class Conversation:
+    net: PetriNet
+    init: Place
+    end: Place
+    arrived_at: float = 0.0
+    finished_at: float = -1.0
+
+
+@dataclass
+class SimulationResult:
+    sim_time: float
+    wall_time: float
+    n_events: int
+    latencies: List[float]
+    backends: Dict[str, Backend]
+
+    @property
+    def throughput(self) -> float:
+        return len(self.latencies) / self.sim_time if self.sim_time > 0 else 0.0
+
+    def print(self) -> None:
+        latencies = sorted(self.latencies)
+        print("========================================")
+        print(f"Simulated {self.sim_time:.1f} s in {self.wall_time:.3f} s "
+              f"({self.sim_time / self.wall_time:.0f}x real time, {self.n_events} events)")
+        print(f"Completed: {len(latencies)}, Throughput: {self.throughput:.3f} conversations/s")
+        if latencies:
+            print(f"Latency: mean {statistics.mean(latencies):.3f} s, "
+                  f"p50 {latencies[len(latencies) // 2]:.3f} s, "
+                  f"p99 {latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]:.3f} s")
+        for name, backend in self.backends.items():
+            utilization = backend.busy_time / (backend.servers * self.sim_time)
+            mean_wait = statistics.mean(backend.waits) if backend.waits else 0.0
+            print(f"  {name}: utilization {utilization:.2%}, mean wait {mean_wait:.3f} s")
+
+
+class Simulation:
+    def __init__(self, backends: Dict[str, Backend], seed: int = 0, max_firings_per_event: int = 10_000):
+        """
+        backends: One per observer transition name.
+        max_firings_per_event: `fire_enabled` raises a RuntimeError if it fires
+            more transitions than this in response to a single event, which
+            happens when firing a transition leaves it (or a cycle) enabled.
+        """
+        self.backends = backends
+        self.max_firings_per_event = max_firings_per_event
+        self.rng = random.Random(seed)
+        self.now = 0.0
+        self.events: List[Tuple[float, int, Callable[[], None]]] = []
+        self.counter = itertools.count()
+        self.n_events = 0
+        self.conversations: List[Conversation] = []
+
+    def schedule(self, delay: float, action: Callable[[], None]) -> None:
+        # The counter breaks ties, so that events at the same time run in FIFO order.
+        heapq.heappush(self.events, (self.now + delay, next(self.counter), action))
+
+    def add_conversation(self, conversation: Conversation, at: float) -> None:
+        """Schedule the arrival of `conversation` at time `at`.
+
+        A transition without input places and without an observer function is
+        always enabled, so `fire_enabled` would fire it forever; such nets are
+        rejected.
+        """
+        for t in conversation.net.transitions:
+            if not t.input_places and t.observer_func is None:
+                raise ValueError(f"Transition {t.name} has no input places and would fire forever")
+
+        def arrive():
+            conversation.arrived_at = self.now
+            conversation.init.create_token()
+            self.request_responses(conversation, [conversation.init])
+            self.fire_enabled(conversation)
+
+        self.conversations.append(conversation)
+        heapq.heappush(self.events, (at, next(self.counter), arrive))
+
+    def fire(self, conversation: Conversation, t: Transition) -> None:
+        for place in t.input_places:
+            place.remove_token()
+        for place in t.output_places:
+            place.create_token()
+        self.request_responses(conversation, t.output_places)
+        if conversation.finished_at < 0 and len(conversation.end.tokens) > 0:
+            conversation.finished_at = self.now
+
+    def fire_enabled(self, conversation: Conversation) -> None:
+        """Fire transitions without an observer function until none is enabled."""
+        n_fired = 0
+        while True:
+            to_fire = [
+                t for t in conversation.net.transitions
+                if t.observer_func is None and transition_is_enabled(t)
+            ]
+            if not to_fire:
+                return
+            for t in to_fire:
+                if transition_is_enabled(t):
+                    self.fire(conversation, t)
+                    n_fired += 1
+            if n_fired > self.max_firings_per_event:
+                raise RuntimeError(
+                    f"Fired {n_fired} transitions for one event; {[t.name for t in to_fire]} stay enabled"
+                )
+
+    def request_responses(self, conversation: Conversation, places: List[Place]) -> None:
+        """Send a request to the backend of every observer transition fed by `places`."""
+        for t in conversation.net.transitions:
+            if t.observer_func is None or t.name not in self.backends:
+                continue
+            if any(place is p for place in places for p in t.input_places):
+                self.enqueue(conversation, t)
+
+    def enqueue(self, conversation: Conversation, t: Transition) -> None:
+        backend = self.backends[t.name]
+        backend.queue.append((self.now, conversation, t))
+        self.start_service(backend)
+
+    def start_service(self, backend: Backend) -> None:
+        while backend.busy < backend.servers and backend.queue:
+            enqueued_at, conversation, t = backend.queue.popleft()
+            backend.waits.append(self.now - enqueued_at)
+            backend.busy += 1
+            service_time = backend.service_time(self.rng)
+            backend.busy_time += service_time
+
+            def respond(conversation=conversation, t=t):
+                backend.busy -= 1
+                if transition_is_enabled(t):
+                    self.fire(conversation, t)
+                    self.fire_enabled(conversation)
+                self.start_service(backend)
+
+            self.schedule(service_time, respond)
+
+    def run(self, until: float = float("inf")) -> SimulationResult:
+        start = time.perf_counter()
+        while self.events and self.events[0][0] <= until:
+            self.now, _, action = heapq.heappop(self.events)
+            action()
+            self.n_events += 1
+        wall_time = time.perf_counter() - start
+
+        latencies = [c.finished_at - c.arrived_at for c in self.conversations if c.finished_at >= 0]
+        return SimulationResult(self.now, wall_time, self.n_events, latencies, self.backends)
+
+
+def create_conversation() -> Conversation:
+    """Create the conversation net of `async_petrinet.main`."""
+    p_init = Place(name="Init")
+    p_req_user = Place(name="ReqUser")
+    p_user_res_ready = Place(name="UserResReady")
+    p_req_api = Place(name="ReqAPI")
+    p_api_res_ready = Place(name="APIResReady")
+    p_end = Place(name="End")
+
+    t_start_conv = Transition("StartConv", [p_init], [p_req_user, p_req_api])
+    t_res_user = Transition("ResUser", [p_req_user], [p_user_res_ready])
+    t_res_api = Transition("ResAPI", [p_req_api], [p_api_res_ready])
+    t_end_conv = Transition("EndConv", [p_user_res_ready, p_api_res_ready], [p_end])
+
+    # Observers are driven by the simulation, so any marker function will do.
+    t_res_user.observer_func = t_res_api.observer_func = lambda value: None
+
+    net = PetriNet()
+    net.places = [p_init, p_req_user, p_user_res_ready, p_req_api, p_api_res_ready, p_end]
+    net.transitions = [t_start_conv, t_res_user, t_res_api, t_end_conv]
+    return Conversation(net, p_init, p_end)
+
+
+def main() -> None:
+    n_conversations, arrival_rate = 10_000, 2.0  # conversations per second
+
+    # The user thinks for about 5 seconds as in `User.respond_mood` and handles
+    # many conversations at once; the weather API takes about a second as in
+    # `WeatherAPI.respond_weather` and serves two requests at a time.
+    backends = {
+        "ResUser": Backend(service_time=lambda rng: rng.expovariate(1 / 5), servers=100),
+        "ResAPI": Backend(service_time=lambda rng: rng.uniform(0.5, 1.5), servers=2),
+    }
+    sim = Simulation(backends)
+
+    at = 0.0
+    for _ in range(n_conversations):
+        at += sim.rng.expovariate(arrival_rate)
+        sim.add_conversation(create_conversation(), at)
+
+    sim.run().print()
+
+
+if __name__ == "__main__":
+    main()
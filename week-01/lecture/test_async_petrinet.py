@@ -0,0 +1,42 @@
+import asyncio
+import contextlib
+
+from async_petrinet import PetriNet, Place, Scheduler, Token, Transition
+
+
+async def run_scheduler_briefly(net: PetriNet, iterations: int = 100) -> None:
+    """Run a scheduler without terminal places for a number of event loop iterations."""
+    task = asyncio.create_task(Scheduler(net, terminal_places=[]).run())
+    for _ in range(iterations):
+        await asyncio.sleep(0)
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
+def test_scheduler_drains_places():
+    # The output place feeds no transition, so firing does not wake the scheduler.
+    p_in = Place(name="In", tokens=[Token() for _ in range(3)])
+    p_end = Place(name="End")
+    net = PetriNet()
+    net.places = [p_in, p_end]
+    net.transitions = [Transition("Step", [p_in], [p_end])]
+
+    asyncio.run(run_scheduler_briefly(net))
+    assert len(p_in.tokens) == 0
+    assert len(p_end.tokens) == 3
+
+
+def test_scheduler_yields_to_event_loop_on_self_loop():
+    p = Place(name="P", tokens=[Token()])
+    net = PetriNet()
+    net.places = [p]
+    net.transitions = [Transition("Loop", [p], [p])]
+
+    async def check():
+        # Without yielding, the scheduler would never give control back and
+        # `run_scheduler_briefly` would not return.
+        await asyncio.wait_for(run_scheduler_briefly(net), timeout=5)
+
+    asyncio.run(check())
+    assert len(p.tokens) == 1
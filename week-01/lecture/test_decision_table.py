@@ -0,0 +1,53 @@
+import contextlib
+import io
+import itertools
+
+import numpy as np
+import pytest
+
+import frame as frame_agent
+from decision_table import ACTIVITY, NEXT_ACTION, DecisionTable, determine_action, recommend_activity
+from frame import Frame, Mood, Weather
+
+# Frames with enum members or unknown strings are outside the tables.
+WEATHERS = [None, *Weather, *(weather.value for weather in Weather), "cloudy"]
+MOODS = [None, *Mood, *(mood.value for mood in Mood), "sleepy"]
+FRAMES = [Frame(weather=w, mood=m) for w, m in itertools.product(WEATHERS, MOODS)]
+
+
+def recommendation(recommend, frame) -> str:
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        try:
+            recommend(frame)
+        except ValueError as e:
+            print(e)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("frame", FRAMES, ids=str)
+def test_same_action_as_frame(frame):
+    assert determine_action(frame) == frame_agent.determine_action(frame)
+
+
+@pytest.mark.parametrize("frame", FRAMES, ids=str)
+def test_same_recommendation_as_frame(frame):
+    assert recommendation(recommend_activity, frame) == recommendation(frame_agent.recommend_activity, frame)
+
+
+def test_lookup_batch_matches_lookup():
+    frames = [Frame(weather=w, mood=m) for w, m in itertools.product(*NEXT_ACTION.domains)]
+    for table in (NEXT_ACTION, ACTIVITY):
+        indices = table.lookup_batch(table.encode(frames))
+        assert [table.actions[i] for i in indices] == [table.lookup(frame) for frame in frames]
+        assert np.array_equal(np.ravel_multi_index(table.encode(frames).T, table.radices),
+                              [table.key(frame) for frame in frames])
+
+
+def test_encode_rejects_values_outside_the_table():
+    with pytest.raises(KeyError):
+        NEXT_ACTION.encode([Frame(weather=Weather.SUNNY)])
+
+
+def test_slot_names_must_be_identifiers():
+    with pytest.raises(ValueError):
+        DecisionTable({"not a name": ["x"]}, [])
@@ -0,0 +1,77 @@
+import asyncio
+import contextlib
+
+import pytest
+
+import async_petrinet
+import simple_petrinet
+from indexed_petrinet import create_synthetic_net
+from metrics import NetMetrics
+
+
+def test_detach_stops_recording():
+    net = create_synthetic_net(100, 10)
+    metrics = NetMetrics()
+    metrics.attach(net)
+    for _ in range(5):
+        simple_petrinet.fire_transitions(net)
+    metrics.detach()
+    fired = sum(metrics.fire_counts.values())
+    assert fired > 0
+
+    simple_petrinet.fire_transitions(net)
+    assert sum(metrics.fire_counts.values()) == fired
+    assert not any(t.fire_hooks for t in net.transitions)
+
+
+def test_attach_rejects_second_net_and_duplicate_names():
+    metrics = NetMetrics()
+    metrics.attach(create_synthetic_net(10, 3))
+    with pytest.raises(ValueError):
+        metrics.attach(create_synthetic_net(10, 3))
+
+    net = simple_petrinet.PetriNet()
+    net.places = [simple_petrinet.Place(name="P"), simple_petrinet.Place(name="P")]
+    with pytest.raises(ValueError):
+        NetMetrics().attach(net)
+
+
+def test_detach_restores_async_net():
+    async def run():
+        p_init = async_petrinet.Place(name="Init")
+        p_req = async_petrinet.Place(name="Req")
+        p_end = async_petrinet.Place(name="End")
+        t_start = async_petrinet.Transition("Start", [p_init], [p_req])
+        t_res = async_petrinet.Transition("Res", [p_req], [p_end])
+
+        async def observer(value: str) -> None:
+            await async_petrinet.fire_transition(t_res, value=value)
+
+        async def request():
+            await asyncio.sleep(0)
+            await observer("done")
+
+        t_res.observer_func = observer
+        t_start.request_funcs.add(request)
+        net = async_petrinet.PetriNet()
+        net.places = [p_init, p_req, p_end]
+        net.transitions = [t_start, t_res]
+
+        metrics = NetMetrics()
+        metrics.attach(net)
+        for _ in range(3):
+            p_init.create_token()
+        scheduler = async_petrinet.Scheduler(net, terminal_places=[])
+        scheduler_task = asyncio.create_task(scheduler.run())
+        while len(p_end.tokens) < 3:
+            await asyncio.sleep(0.001)
+        scheduler_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await scheduler_task
+        metrics.detach()
+
+        assert metrics.fire_counts == {"Start": 3, "Res": 3}
+        assert t_start.request_funcs == {request}
+        assert p_req.listeners == [scheduler.on_change]
+
+    asyncio.run(asyncio.wait_for(run(), timeout=10))
@@ -0,0 +1,42 @@
+from reachability import OMEGA, _covers_strictly, explore
+from simple_petrinet import PetriNet, Place, create_transition
+
+
+def create_chains(n_chains: int, chain_length: int) -> PetriNet:
+    net = PetriNet()
+    for c in range(n_chains):
+        chain = [Place(name=f"P{c}_{i}", token_count=int(i == 0)) for i in range(chain_length + 1)]
+        net.places.extend(chain)
+        for i in range(chain_length):
+            net.transitions.append(create_transition(f"T{c}_{i}", [chain[i]], [chain[i + 1]]))
+    return net
+
+
+def test_equal_markings_do_not_cover_strictly():
+    assert not _covers_strictly([1, 2, 0], (1, 2, 0))
+    assert _covers_strictly([1, 3, 0], (1, 2, 0))
+    assert _covers_strictly([OMEGA, 0], (1, 0))
+    assert not _covers_strictly([0, 3], (1, 2))
+
+
+def test_chains_interleave():
+    result = explore(create_chains(2, 3), terminal_places=(f"P{c}_3" for c in range(2)))
+    assert result.complete
+    assert result.n_markings == 16
+    assert result.deadlocks == []
+    assert len(result.terminal_markings) == 1
+    assert result.unbounded_places == []
+
+
+def test_unbounded_place():
+    p_a, p_b, p_end = Place(name="A", token_count=1), Place(name="B"), Place(name="End")
+    net = PetriNet()
+    net.places.extend([p_a, p_b, p_end])
+    net.transitions.extend([
+        create_transition("Grow", [p_a], [p_a, p_b]),
+        create_transition("Stop", [p_a], [p_end]),
+    ])
+    result = explore(net)
+    assert result.complete
+    assert result.unbounded_places == ["B"]
+    assert result.deadlocks == []
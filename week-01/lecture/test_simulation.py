@@ -0,0 +1,35 @@
+import pytest
+
+from async_petrinet import Transition
+from simulation import Backend, Simulation, create_conversation
+
+
+def create_simulation() -> Simulation:
+    backends = {
+        "ResUser": Backend(service_time=lambda rng: 1.0),
+        "ResAPI": Backend(service_time=lambda rng: 1.0),
+    }
+    return Simulation(backends, max_firings_per_event=100)
+
+
+def test_conversation_completes():
+    sim = create_simulation()
+    sim.add_conversation(create_conversation(), 0.0)
+    result = sim.run()
+    assert result.latencies == [1.0]
+
+
+def test_source_transition_is_rejected():
+    conversation = create_conversation()
+    conversation.net.transitions.append(Transition("Spawn", [], [conversation.init]))
+    with pytest.raises(ValueError, match="Spawn"):
+        create_simulation().add_conversation(conversation, 0.0)
+
+
+def test_transition_that_stays_enabled_raises():
+    conversation = create_conversation()
+    conversation.net.transitions.append(Transition("Idle", [conversation.end], [conversation.end]))
+    sim = create_simulation()
+    sim.add_conversation(conversation, 0.0)
+    with pytest.raises(RuntimeError, match="Idle"):
+        sim.run()
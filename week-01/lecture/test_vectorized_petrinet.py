@@ -0,0 +1,34 @@
+import copy
+
+import numpy as np
+import pytest
+
+from simple_petrinet import PetriNet, Place, create_transition, fire_transitions
+from vectorized_petrinet import (
+    batch_markings, compile_net, create_conversation_net, fire_transitions_batch, get_marking,
+)
+
+
+def test_batch_matches_fire_transitions():
+    net = create_conversation_net()
+    cnet = compile_net(net)
+    nets = [copy.deepcopy(net) for _ in range(3)]
+    markings = batch_markings(get_marking(net), 3)
+    for _ in range(4):
+        for session in nets:
+            fire_transitions(session)
+        markings, _ = fire_transitions_batch(cnet, markings)
+        assert np.array_equal(markings, [get_marking(session) for session in nets])
+
+
+def test_competing_transitions_are_detected_before_firing():
+    p_in, p_a, p_b = Place(name="In", token_count=1), Place(name="A"), Place(name="B")
+    net = PetriNet()
+    net.places.extend([p_in, p_a, p_b])
+    net.transitions.extend([create_transition("ToA", [p_in], [p_a]), create_transition("ToB", [p_in], [p_b])])
+    markings = batch_markings(get_marking(net), 2)
+    before = markings.copy()
+
+    with pytest.raises(AssertionError, match=r"Session 0: transitions \['ToA', 'ToB'\] compete .* In"):
+        fire_transitions_batch(compile_net(net), markings)
+    assert np.array_equal(markings, before)
@@ -0,0 +1,157 @@
+"""
+Tracing for the agents in `fsm.py` and `frame.py`.
+
+Instead of printing on every event, the agents hand a trace record
+(timestamp, state, event, transition) to a sink:
+
+* `PrintSink` prints the records as the agents used to.
+* `RingBufferSink` keeps the latest records in preallocated lists.
+* `FileSink` formats and writes the records on a background thread.
+* `NullSink` drops everything. Agents check `sink.enabled` before building a
+  record, so with this sink no record is created and nothing is formatted.
+"""
+import os
+import queue
+import tempfile
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+
+@dataclass(slots=True)
+class TraceRecord:
+    timestamp: float
+    state: Any
+    event: Any
+    transition: Any
+
+
+class TraceSink(ABC):
+    enabled = True
+
+    @abstractmethod
+    def write(self, timestamp: float, state: Any, event: Any, transition: Any) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class NullSink(TraceSink):
+    enabled = False
+
+    def write(self, timestamp: float, state: Any, event: Any, transition: Any) -> None:
+        pass
+
+
+class PrintSink(TraceSink):
+    def __init__(self, format: Callable[[TraceRecord], str]):
+        self.format = format
+
+    def write(self, timestamp: float, state: Any, event: Any, transition: Any) -> None:
+        print(self.format(TraceRecord(timestamp, state, event, transition)))
+
+
+class RingBufferSink(TraceSink):
+    """Keep the latest `capacity` records. The fields are stored in preallocated
+    lists, so writing a record does not create a `TraceRecord`."""
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.timestamps: List[float] = [0.0] * capacity
+        self.states: List[Any] = [None] * capacity
+        self.events: List[Any] = [None] * capacity
+        self.transitions: List[Any] = [None] * capacity
+        self.count = 0
+
+    def write(self, timestamp: float, state: Any, event: Any, transition: Any) -> None:
+        i = self.count % self.capacity
+        self.timestamps[i] = timestamp
+        self.states[i] = state
+        self.events[i] = event
+        self.transitions[i] = transition
+        self.count += 1
+
+    def records(self) -> List[TraceRecord]:
+        """Return the stored records from the oldest to the newest."""
+        n = min(self.count, self.capacity)
+        start = self.count - n
+        return [
+            TraceRecord(self.timestamps[i], self.states[i], self.events[i], self.transitions[i])
+            for i in (j % self.capacity for j in range(start, start + n))
+        ]
+
+
+class FileSink(TraceSink):
+    """Format records and append them to a file on a background thread."""
+
+    def __init__(self, path: str, format: Callable[[TraceRecord], str]):
+        self.format = format
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.file = open(path, "a")
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, timestamp: float, state: Any, event: Any, transition: Any) -> None:
+        self.queue.put((timestamp, state, event, transition))
+
+    def close(self) -> None:
+        """Write the remaining records and close the file."""
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            self.file.write(self.format(TraceRecord(*item)) + "\n")
+
+
+def trace(sink: TraceSink, state: Any, event: Any, transition: Any) -> None:
+    """Write a record with the current time to `sink`, unless it is disabled."""
+    if sink.enabled:
+        sink.write(time.perf_counter(), state, event, transition)
+
+
+def main() -> None:
+    import contextlib
+    import fsm
+
+    n_events = 100_000
+    events = [fsm.Event("Weather", "sunny"), fsm.Event("Mood", "chill")]
+
+    def run(sink: Optional[TraceSink]) -> float:
+        machine = fsm.StateMachine(sink=sink)
+        start = time.perf_counter()
+        for i in range(n_events // 2):
+            machine.state = fsm.WeatherState()
+            for event in events:
+                machine.handle(event)
+        elapsed = time.perf_counter() - start
+        if sink is not None:
+            sink.close()
+        return elapsed * 1e9 / n_events
+
+    # `recommend_activity` prints in every mode; its output is discarded.
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        path = os.path.join(directory, "fsm_trace.txt")
+        results = {
+            "PrintSink (default)": run(None),
+            "FileSink": run(FileSink(path, fsm.format_record)),
+            "RingBufferSink": run(RingBufferSink()),
+            "NullSink": run(NullSink()),
+        }
+
+    print(f"Events: {n_events}")
+    for name, ns_per_event in results.items():
+        print(f"{name + ':':22}{ns_per_event:.0f} ns/event")
+
+
+if __name__ == "__main__":
+    main()
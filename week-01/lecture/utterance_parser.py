@@ -0,0 +1,146 @@
+"""
+A parser for `key:value; key:value` utterances of the frame-based agent in `frame.py`.
+
+The set of valid values of each slot is built once, so checking a value is a
+single set lookup. Utterances can be read from any iterable of lines, e.g. a
+log file or a socket, and are turned into events in batches, which makes it
+possible to replay large logs through the agent.
+"""
+import os
+import random
+import socket
+import tempfile
+import time
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+
+class SlotParser:
+    def __init__(self, slots: Dict[str, Iterable[str]], event_type: Callable[..., Any]):
+        """
+        slots: The valid values of each slot.
+        event_type: Called with the parsed slot values as keyword arguments, e.g. `InputEvent`.
+        """
+        self.valid = {key: frozenset(values) for key, values in slots.items()}
+        self.event_type = event_type
+
+    def parse(self, utterance: str) -> Any:
+        """Parse one utterance. Items that are malformed or have an invalid
+        value are ignored, and later items override earlier ones."""
+        values = {}
+        valid = self.valid
+        for item in utterance.split(";"):
+            parts = item.split(":")
+            if len(parts) != 2:
+                continue
+            key = parts[0].strip()
+            value = parts[1].strip()
+            if key in valid and value in valid[key]:
+                values[key] = value
+        return self.event_type(**values)
+
+    def parse_batch(self, utterances: Iterable[str]) -> List[Any]:
+        parse = self.parse
+        return [parse(utterance) for utterance in utterances]
+
+    def iter_batches(self, lines: Iterable[str], batch_size: int = 10_000) -> Iterator[List[Any]]:
+        """Parse a stream of lines (one utterance per line) into batches of events."""
+        batch: List[str] = []
+        for line in lines:
+            batch.append(line.rstrip("\n"))
+            if len(batch) == batch_size:
+                yield self.parse_batch(batch)
+                batch = []
+        if batch:
+            yield self.parse_batch(batch)
+
+
+def iter_file(path: str) -> Iterator[str]:
+    with open(path) as f:
+        yield from f
+
+
+def iter_socket(sock: socket.socket) -> Iterator[str]:
+    """Read lines from a connected socket until the peer closes it."""
+    with sock.makefile("r") as f:
+        yield from f
+
+
+def main() -> None:
+    from frame import Action, Frame, InputEvent, Mood, Weather, determine_action, update_frame
+
+    parser = SlotParser(
+        {"weather": [item.value for item in Weather], "mood": [item.value for item in Mood]},
+        InputEvent,
+    )
+
+    # A log of utterances, including malformed and invalid ones.
+    n = 1_000_000
+    rng = random.Random(0)
+    choices = [
+        "weather:sunny", "weather:rainy", "mood:active", "mood:chill",
+        "weather:sunny; mood:chill", " mood : active ;weather:rainy", "weather:cloudy", "hello", "a:b:c",
+    ]
+
+    def parse_inline(response: str) -> InputEvent:
+        # The parsing loop of `frame.py`.
+        items = response.split(";")
+        event = InputEvent()
+        for item in items:
+            try:
+                key, value = item.split(":")
+                key = key.strip()
+                value = value.strip()
+                if key == "weather" and value in (item.value for item in Weather):
+                    event.weather = value
+                elif key == "mood" and value in (item.value for item in Mood):
+                    event.mood = value
+            except ValueError:
+                pass
+        return event
+
+    def replay(events: Iterable[InputEvent]) -> int:
+        """Feed events to the agent, starting a new conversation after each recommendation."""
+        recommendations = 0
+        frame = Frame()
+        for event in events:
+            frame = update_frame(event, frame)
+            if determine_action(frame) == Action.RECOMMEND_ACTIVITY:
+                recommendations += 1
+                frame = Frame()
+        return recommendations
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "utterances.log")
+        with open(path, "w") as f:
+            for _ in range(n):
+                f.write(rng.choice(choices) + "\n")
+
+        start = time.perf_counter()
+        expected = [parse_inline(line.rstrip("\n")) for line in iter_file(path)]
+        elapsed_inline = time.perf_counter() - start
+
+        start = time.perf_counter()
+        events = [event for batch in parser.iter_batches(iter_file(path)) for event in batch]
+        elapsed_parser = time.perf_counter() - start
+
+        start = time.perf_counter()
+        recommendations = replay(event for batch in parser.iter_batches(iter_file(path)) for event in batch)
+        elapsed_replay = time.perf_counter() - start
+
+    print(f"Same events: {events == expected}")
+    print(f"Utterances: {n}")
+    print(f"Inline parsing:     {elapsed_inline * 1e9 / n:.0f} ns/utterance")
+    print(f"SlotParser:         {elapsed_parser * 1e9 / n:.0f} ns/utterance")
+    print(f"Parse and replay:   {elapsed_replay:.2f} s ({recommendations} recommendations)")
+
+    # The same parser reads from a socket.
+    server, client = socket.socketpair()
+    client.sendall(b"weather:sunny; mood:chill\nmood:active\n")
+    client.close()
+    print(f"From a socket: {[e for batch in parser.iter_batches(iter_socket(server)) for e in batch]}")
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+A vectorized backend for the Petri net in `simple_petrinet.py`.
+
+The net is compiled into two matrices with one row per transition and one
+column per place:
+
+* `pre[t, p]`: the number of tokens transition `t` consumes from place `p`
+* `post[t, p]`: the number of tokens transition `t` produces in place `p`
+
+A marking is a vector of token counts, and a batch of markings (one row per
+session) is a matrix of shape (sessions, places). Checking which transitions
+are enabled and firing them is then done for all sessions at once with matrix
+products instead of mutating `Place.token_count` one object at a time.
+"""
+import copy
+import time
+
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+from simple_petrinet import PetriNet, Place, create_transition, fire_transitions
+
+
+@dataclass
+class CompiledNet:
+    place_names: List[str]
+    transition_names: List[str]
+    pre: np.ndarray
+    post: np.ndarray
+
+    def __post_init__(self):
+        self.incidence = (self.post - self.pre).astype(np.float64)
+        # A transition is enabled if each of its input places holds a token,
+        # i.e. if the number of non-empty input places equals its arity.
+        self.input_mask = (self.pre > 0).astype(np.float64)
+        self.arity = self.input_mask.sum(axis=1)
+
+
+def compile_net(net: PetriNet) -> CompiledNet:
+    """Compile the places and transitions of `net` into pre/post incidence matrices."""
+    index = {id(place): i for i, place in enumerate(net.places)}
+    pre = np.zeros((len(net.transitions), len(net.places)), dtype=np.int64)
+    post = np.zeros_like(pre)
+    for t, transition in enumerate(net.transitions):
+        for place in transition.input_places:
+            pre[t, index[id(place)]] += 1
+        for place in transition.output_places:
+            post[t, index[id(place)]] += 1
+
+    return CompiledNet(
+        place_names=[place.name for place in net.places],
+        transition_names=[transition.name for transition in net.transitions],
+        pre=pre,
+        post=post,
+    )
+
+
+def get_marking(net: PetriNet) -> np.ndarray:
+    """Read the current token counts of `net` into a marking vector."""
+    return np.array([place.token_count for place in net.places], dtype=np.int64)
+
+
+def set_marking(net: PetriNet, marking: np.ndarray) -> None:
+    """Write a marking vector back into the places of `net`."""
+    for place, count in zip(net.places, marking):
+        place.token_count = int(count)
+
+
+def batch_markings(marking: np.ndarray, n_sessions: int) -> np.ndarray:
+    """Create a batch of `n_sessions` copies of a marking."""
+    return np.tile(marking, (n_sessions, 1))
+
+
+def enabled_transitions(cnet: CompiledNet, markings: np.ndarray) -> np.ndarray:
+    """Return a boolean matrix of shape (sessions, transitions) of enabled transitions."""
+    non_empty = (markings > 0).astype(np.float64)
+    return non_empty @ cnet.input_mask.T == cnet.arity
+
+
+def fire_transitions_batch(cnet: CompiledNet, markings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Fire all transitions that are enabled at the start of the step in every session,
+    like `fire_transitions` does for a single net.
+
+    Returns the new markings and the boolean matrix of fired transitions.
+
+    Before anything is fired, the tokens the enabled transitions consume
+    together are compared with the marking at the start of the step, and the
+    step fails with an assertion naming the first session and place where
+    enabled transitions compete for the same tokens. `fire_transitions` fires
+    one transition after another instead, so a transition can consume a token
+    produced earlier in the same step; the batch step does not allow that and
+    fails where the sequential step would succeed. Where the batch step
+    succeeds, both give the same markings.
+    """
+    fired = enabled_transitions(cnet, markings)
+    fired_f = fired.astype(np.float64)
+    consumed = fired_f @ cnet.pre
+    conflicts = consumed > markings
+    if conflicts.any():
+        session, place = np.argwhere(conflicts)[0]
+        competing = [cnet.transition_names[t] for t in np.flatnonzero(fired[session] & (cnet.pre[:, place] > 0))]
+        raise AssertionError(
+            f"Session {session}: transitions {competing} compete for the "
+            f"{markings[session, place]} token(s) in {cnet.place_names[place]}"
+        )
+
+    new_markings = markings + (fired_f @ cnet.incidence).astype(markings.dtype)
+    return new_markings, fired
+
+
+def create_conversation_net() -> PetriNet:
+    """Create the conversation net used in `simple_petrinet.main`."""
+    net = PetriNet()
+    p_init = Place(name="Init", token_count=1)
+    p_req_user = Place(name="ReqUser")
+    p_user_res_ready = Place(name="UserResReady")
+    p_req_api = Place(name="ReqAPI")
+    p_api_res_ready = Place(name="APIResReady")
+    p_end = Place(name="End")
+
+    t_start_conv = create_transition("StartConv", [p_init], [p_req_user, p_req_api])
+    t_res_user = create_transition("ResUser", [p_req_user], [p_user_res_ready])
+    t_res_api = create_transition("ResAPI", [p_req_api], [p_api_res_ready])
+    t_combine_res = create_transition("CombineRes", [p_user_res_ready, p_api_res_ready], [p_end])
+
+    net.places.extend([p_init, p_req_user, p_user_res_ready, p_req_api, p_api_res_ready, p_end])
+    net.transitions.extend([t_start_conv, t_res_user, t_res_api, t_combine_res])
+    return net
+
+
+def main() -> None:
+    n_sessions, n_steps = 50_000, 4
+
+    net = create_conversation_net()
+    cnet = compile_net(net)
+    print("Pre:")
+    print(cnet.pre)
+    print("Post:")
+    print(cnet.post)
+
+    # Baseline: one `PetriNet` object per session.
+    nets = [copy.deepcopy(net) for _ in range(n_sessions)]
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        for session in nets:
+            fire_transitions(session)
+    elapsed_objects = time.perf_counter() - start
+
+    # Vectorized: one row per session.
+    markings = batch_markings(get_marking(net), n_sessions)
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        markings, _ = fire_transitions_batch(cnet, markings)
+    elapsed_batch = time.perf_counter() - start
+
+    expected = np.array([get_marking(session) for session in nets])
+    print(f"Sessions: {n_sessions}, Steps: {n_steps}")
+    print(f"fire_transitions per net: {elapsed_objects * 1000 / n_steps:.3f} ms/step")
+    print(f"fire_transitions_batch:   {elapsed_batch * 1000 / n_steps:.3f} ms/step")
+    print(f"Same markings: {np.array_equal(expected, markings)}")
+
+    set_marking(net, markings[0])
+    print(f"Final marking of session 0: "
+          f"{', '.join(f'{p.name}: {p.token_count}' for p in net.places)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+A vectorized simulator for the bandit policies in `01_bandit.ipynb` and the softmax exercises.
+
+The notebooks run one trial at a time and copy the whole `State` on every
+update, so averaging the regret over many seeds is slow. Here, R independent
+runs are simulated together: the counts and reward sums of all runs are
+(R, arms) arrays, each policy picks the arms of all runs at once, and the
+rewards of all runs are drawn at once.
+
+The regret is the expected (pseudo) regret: the sum over trials of the
+difference between the best arm's theta and the chosen arm's theta.
+"""
+import copy
+import time
+
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+
+@dataclass
+class BanditState:
+    counts: np.ndarray  # (runs, arms): number of times each arm was chosen
+    sums: np.ndarray  # (runs, arms): sum of the rewards of each arm
+
+    @property
+    def values(self) -> np.ndarray:
+        """The estimated theta of each arm (0 for arms that were never chosen)."""
+        return self.sums / np.maximum(self.counts, 1)
+
+
+def _sample_categorical(p: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Draw one index per row of the probability matrix `p`."""
+    u = rng.random((p.shape[0], 1))
+    arms = (np.cumsum(p, axis=1) < u).sum(axis=1)
+    return np.minimum(arms, p.shape[1] - 1)
+
+
+def _softmax(values: np.ndarray, tau: float) -> np.ndarray:
+    logit = values / tau
+    logit = logit - logit.max(axis=1, keepdims=True)
+    p = np.exp(logit)
+    return p / p.sum(axis=1, keepdims=True)
+
+
+@dataclass
+class EpsilonGreedy:
+    eps: float = 0.1
+
+    def get_arms(self, state: BanditState, t: int, rng: np.random.Generator) -> np.ndarray:
+        n_runs, n_arms = state.counts.shape
+        arms = np.argmax(state.values, axis=1)
+        explore = rng.random(n_runs) < self.eps
+        arms[explore] = rng.integers(n_arms, size=explore.sum())
+        return arms
+
+
+@dataclass
+class Softmax:
+    tau: float = 0.1
+
+    def get_arms(self, state: BanditState, t: int, rng: np.random.Generator) -> np.ndarray:
+        return _sample_categorical(_softmax(state.values, self.tau), rng)
+
+
+@dataclass
+class AnnealingSoftmax:
+    # The temperature at trial t; it decreases, so the policy explores less over time.
+    schedule: Callable[[int], float] = lambda t: 1 / np.log(t + 1.0000001)
+
+    def get_arms(self, state: BanditState, t: int, rng: np.random.Generator) -> np.ndarray:
+        return _sample_categorical(_softmax(state.values, self.schedule(t)), rng)
+
+
+class ThompsonSampling:
+    def get_arms(self, state: BanditState, t: int, rng: np.random.Generator) -> np.ndarray:
+        # One Beta(successes + 1, failures + 1) draw per run and arm.
+        samples = rng.beta(state.sums + 1, state.counts - state.sums + 1)
+        return np.argmax(samples, axis=1)
+
+
+@dataclass
+class SimulationResult:
+    arms: np.ndarray  # (runs, trials)
+    rewards: np.ndarray  # (runs, trials)
+    regrets: np.ndarray  # (runs, trials): cumulative regret
+
+    @property
+    def mean_regret(self) -> np.ndarray:
+        return self.regrets.mean(axis=0)
+
+    def confidence_band(self, z: float = 1.96) -> np.ndarray:
+        """Lower and upper bounds (2, trials) of the confidence interval of the mean regret."""
+        se = self.regrets.std(axis=0, ddof=1) / np.sqrt(self.regrets.shape[0])
+        return np.stack([self.mean_regret - z * se, self.mean_regret + z * se])
+
+
+def simulate(policy, thetas, n_trials: int = 1000, n_runs: int = 1000, seed: int = 0) -> SimulationResult:
+    """Run `n_runs` independent replications of `n_trials` trials of `policy`."""
+    rng = np.random.default_rng(seed)
+    thetas = np.asarray(thetas, dtype=np.float64)
+    n_arms = len(thetas)
+    state = BanditState(np.zeros((n_runs, n_arms)), np.zeros((n_runs, n_arms)))
+    runs = np.arange(n_runs)
+
+    arms = np.zeros((n_runs, n_trials), dtype=np.int64)
+    rewards = np.zeros((n_runs, n_trials))
+    for t in range(n_trials):
+        arm = policy.get_arms(state, t, rng)
+        reward = (rng.random(n_runs) < thetas[arm]).astype(np.float64)
+        state.counts[runs, arm] += 1
+        state.sums[runs, arm] += reward
+        arms[:, t] = arm
+        rewards[:, t] = reward
+
+    regrets = np.cumsum(thetas.max() - thetas[arms], axis=1)
+    return SimulationResult(arms, rewards, regrets)
+
+
+def simulate_loop(thetas, n_trials: int, n_runs: int, eps: float = 0.1) -> np.ndarray:
+    """Epsilon-greedy as in `01_bandit.ipynb`, one run and one trial at a time."""
+    thetas = np.asarray(thetas)
+    regrets = []
+    for _ in range(n_runs):
+        counts, values = np.zeros(len(thetas)), np.zeros(len(thetas))
+        chosen = []
+        for _ in range(n_trials):
+            if np.random.random() < eps:
+                arm = np.random.randint(len(thetas))
+            else:
+                arm = np.argmax(values)
+            reward = 1.0 if np.random.random() < thetas[arm] else 0
+            counts, values = copy.deepcopy(counts), copy.deepcopy(values)
+            counts[arm] += 1
+            values[arm] = ((counts[arm] - 1) * values[arm] + reward) / counts[arm]
+            chosen.append(arm)
+        regrets.append(np.cumsum(thetas.max() - thetas[chosen]))
+    return np.array(regrets)
+
+
+def main() -> None:
+    thetas = [0.80, 0.50, 0.35, 0.60]  # Cycling, Picnic, Climbing, Movie
+    n_trials, n_runs = 1000, 1000
+
+    n_loop_runs = 20
+    start = time.perf_counter()
+    loop_regrets = simulate_loop(thetas, n_trials, n_loop_runs)
+    elapsed_loop = time.perf_counter() - start
+    print(f"Loop, {n_loop_runs} runs: {elapsed_loop:.2f} s, about {elapsed_loop * n_runs / n_loop_runs:.1f} s "
+          f"for {n_runs} runs (final regret {loop_regrets[:, -1].mean():.1f})")
+
+    policies = {
+        "eps-greedy": EpsilonGreedy(),
+        "softmax": Softmax(),
+        "annealing softmax": AnnealingSoftmax(),
+        "Thompson sampling": ThompsonSampling(),
+    }
+    for name, policy in policies.items():
+        start = time.perf_counter()
+        result = simulate(policy, thetas, n_trials, n_runs)
+        elapsed = time.perf_counter() - start
+        low, high = result.confidence_band()[:, -1]
+        print(f"{name}, {n_runs} runs: {elapsed:.2f} s "
+              f"(final regret {result.mean_regret[-1]:.1f}, 95% CI [{low:.1f}, {high:.1f}])")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+A vectorized expected-utility engine for `04_parameter_estimation_2.ipynb`.
+
+`expected_utility` in the exercise runs `Predictive` for one weather and one
+action at a time, and `list_utilities` loops over the actions, once per
+weather drawn by `weather_generator`. Here, the posterior is given as sample
+arrays: the probabilities of what a user does after each recommendation,
+`transitions[s, weather, action, activity]`, and the utility of each activity,
+`utility[s, weather, activity]` (or one fixed table for all samples). The
+expected utility of every weather and action is then one tensor contraction
+over samples and activities:
+
+    EU[weather, action] = mean_s sum_x transitions[s, weather, action, x] * utility[s, weather, x]
+
+The table is computed once per posterior version, so ranking the actions for
+any number of users is one indexing operation.
+"""
+import time
+
+from typing import Optional
+
+import numpy as np
+
+ACTIVITIES = ['cycling', 'picnic', 'climbing', 'movie']
+
+
+class DecisionEngine:
+    def __init__(self, transitions: np.ndarray, utility: np.ndarray):
+        self.version = 0
+        self._cache_version: Optional[int] = None
+        self._table: Optional[np.ndarray] = None
+        self.update_posterior(transitions, utility)
+
+    def update_posterior(self, transitions: np.ndarray, utility: np.ndarray) -> None:
+        """
+        transitions: (samples, weathers, actions, activities) posterior samples.
+        utility: (samples, weathers, activities) posterior samples, or a
+            (weathers, activities) table used for every sample.
+        """
+        self.transitions = np.asarray(transitions)
+        self.utility = np.broadcast_to(utility, self.transitions.shape[:2] + self.transitions.shape[3:])
+        self.version += 1
+
+    def expected_utilities(self) -> np.ndarray:
+        """The expected utility of every (weather, action), computed once per posterior version."""
+        if self._cache_version != self.version:
+            n_samples = self.transitions.shape[0]
+            self._table = np.einsum("swax,swx->wa", self.transitions, self.utility, optimize=True) / n_samples
+            self._cache_version = self.version
+        return self._table
+
+    def rank(self, weathers: np.ndarray) -> np.ndarray:
+        """The actions of each user from best to worst (users, actions)."""
+        return np.argsort(-self.expected_utilities(), axis=1)[np.asarray(weathers)]
+
+    def recommend(self, weathers: np.ndarray) -> np.ndarray:
+        """The best action of each user."""
+        return np.argmax(self.expected_utilities(), axis=1)[np.asarray(weathers)]
+
+
+def posterior_samples(weather, actions, x, r, n_weathers=2, n_actions=4, n_samples=2000, seed=0):
+    """Posterior samples of the exercise's data under conjugate priors: a
+    Dirichlet(1, ..., 1) prior for each row of the transition matrices and a
+    Beta(1, 1) prior for each utility."""
+    rng = np.random.default_rng(seed)
+    n_activities = n_actions
+    counts = np.zeros((n_weathers, n_actions, n_activities))
+    np.add.at(counts, (weather, actions, x), 1)
+    successes = np.zeros((n_weathers, n_activities))
+    trials = np.zeros((n_weathers, n_activities))
+    np.add.at(successes, (weather, x), r)
+    np.add.at(trials, (weather, x), 1)
+
+    # Dirichlet draws with a different concentration per row: normalized gamma draws.
+    gamma = rng.gamma(1 + counts, size=(n_samples,) + counts.shape)
+    transitions = gamma / gamma.sum(axis=-1, keepdims=True)
+    utility = rng.beta(1 + successes, 1 + trials - successes, size=(n_samples,) + successes.shape)
+    return transitions, utility
+
+
+def main() -> None:
+    T_rain = np.array([[0.15, 0.05, 0.40, 0.40],  # Cycling
+                       [0.05, 0.15, 0.40, 0.40],  # Picnic
+                       [0.05, 0.05, 0.8, 0.1],  # Climbing
+                       [0.05, 0.05, 0.1, 0.8]])  # Movie
+    T_sunny = np.array([[0.70, 0.20, 0.05, 0.05],  # Cycling
+                        [0.20, 0.70, 0.05, 0.05],  # Picnic
+                        [0.40, 0.40, 0.10, 0.10],  # Climbing
+                        [0.40, 0.40, 0.10, 0.10]])  # Movie
+    user_utility = np.array([[0.1, 0.1, 0.7, 0.8],
+                             [0.8, 0.8, 0.2, 0.1]])
+
+    # The synthetic data of the exercise: 100 recommendations of each action in each weather.
+    rng = np.random.default_rng(0)
+    weather = np.repeat([0, 1], 400)
+    actions = np.tile(np.repeat(np.arange(4), 100), 2)
+    T = np.stack([T_rain, T_sunny])
+    x = np.array([rng.choice(4, p=T[w, a]) for w, a in zip(weather, actions)])
+    r = (rng.random(len(x)) < user_utility[weather, x]).astype(int)
+    transitions, utility = posterior_samples(weather, actions, x, r)
+
+    def expected_utility(weather: int, action: int) -> float:
+        # `expected_utility` of the exercise over the posterior samples.
+        return float(np.mean([np.dot(transitions[s, weather, action], utility[s, weather])
+                              for s in range(len(transitions))]))
+
+    def list_utilities(weather: int):
+        return [expected_utility(weather, action) for action in range(4)]
+
+    n_users = 20
+    weathers = rng.integers(2, size=n_users)  # `weather_generator` for each user
+    start = time.perf_counter()
+    loop_best = [int(np.argmax(list_utilities(w))) for w in weathers]
+    elapsed_loop = time.perf_counter() - start
+
+    engine = DecisionEngine(transitions, utility)
+    start = time.perf_counter()
+    table = engine.expected_utilities()
+    elapsed_table = time.perf_counter() - start
+
+    n_batch = 1_000_000
+    batch_weathers = rng.integers(2, size=n_batch)
+    start = time.perf_counter()
+    ranking = engine.rank(batch_weathers)
+    elapsed_rank = time.perf_counter() - start
+
+    same = np.allclose(table, [list_utilities(0), list_utilities(1)])
+    print(f"Same expected utilities as the loop: {same}")
+    print(f"Same recommendations: {loop_best == engine.recommend(weathers).tolist()}")
+    print(f"Loops:                {elapsed_loop * 1e3 / n_users:.1f} ms/user")
+    print(f"Contraction:          {elapsed_table * 1e3:.2f} ms (once per posterior version)")
+    print(f"Ranking {n_batch} users: {elapsed_rank * 1e3:.1f} ms")
+
+    np.set_printoptions(precision=3)
+    for w, name in enumerate(["rainy", "sunny"]):
+        print(f"EU on a {name} day: {table[w]}, recommend {ACTIVITIES[ranking[batch_weathers == w][0][0]]}")
+
+
+if __name__ == "__main__":
+    main()
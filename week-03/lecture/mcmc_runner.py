@@ -0,0 +1,200 @@
+"""
+A multi-chain MCMC runner for the numpyro models of week 3 (`02_ppl.ipynb`,
+`02_contextual_bandit.ipynb` and `04_parameter_estimation_2.ipynb`).
+
+The notebooks run one NUTS chain with `MCMC`, which uses one core and compiles
+the sampler again on every `run`. `MCMCRunner` runs several chains at once:
+on separate host devices (`pmap`) when there are enough of them, otherwise
+vectorized on one device (`vmap`). The compiled sampler is cached per model
+and configuration, so later runs with data of the same shape skip compilation.
+Each run reports its wall time, the effective sample size (ESS) per second and
+the split R-hat of every parameter.
+
+JAX sees one CPU device unless told otherwise before it starts, so call
+`set_host_devices()` before running any JAX computation.
+"""
+import os
+import time
+
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Callable, Dict, Optional
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+import numpyro
+import numpyro.distributions as dist
+
+from jax import lax, random
+from numpyro.diagnostics import print_summary, summary
+from numpyro.infer import MCMC, NUTS
+from numpyro.infer.hmc import hmc
+from numpyro.infer.util import initialize_model
+
+
+def set_host_devices(n: Optional[int] = None) -> None:
+    """Expose `n` CPU devices to JAX (default: one per core)."""
+    numpyro.set_host_device_count(n or os.cpu_count())
+
+
+@dataclass
+class InferenceResult:
+    samples: Dict[str, np.ndarray]  # (chains, samples, ...)
+    wall_time: float  # seconds
+    num_divergences: int
+
+    def get_samples(self, group_by_chain: bool = False) -> Dict[str, np.ndarray]:
+        if group_by_chain:
+            return self.samples
+        return {name: value.reshape((-1,) + value.shape[2:]) for name, value in self.samples.items()}
+
+    @cached_property
+    def diagnostics(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """Mean, std, quantiles, `n_eff` and `r_hat` of every site, computed once."""
+        return summary(self.samples, group_by_chain=True)
+
+    @property
+    def min_ess(self) -> float:
+        return float(min(np.min(site["n_eff"]) for site in self.diagnostics.values()))
+
+    @property
+    def max_r_hat(self) -> float:
+        return float(max(np.nanmax(site["r_hat"]) for site in self.diagnostics.values()))
+
+    @property
+    def ess_per_second(self) -> float:
+        """The smallest ESS over all parameters per second of wall time."""
+        return self.min_ess / self.wall_time
+
+    def print_summary(self) -> None:
+        print_summary(self.samples, group_by_chain=True)
+        print(f"Wall time: {self.wall_time:.2f} s, min ESS/s: {self.ess_per_second:.0f}, "
+              f"max R-hat: {self.max_r_hat:.3f}, divergences: {self.num_divergences}")
+
+
+class MCMCRunner:
+    def __init__(
+        self,
+        model: Callable,
+        num_warmup: int = 1000,
+        num_samples: int = 2000,
+        num_chains: int = 4,
+        chain_method: Optional[str] = None,
+    ):
+        """
+        chain_method: "parallel" (one chain per device) or "vectorized" (all chains
+            on one device). By default, parallel if there are enough devices.
+        """
+        if chain_method is None:
+            chain_method = "parallel" if jax.local_device_count() >= num_chains else "vectorized"
+        if chain_method == "parallel" and jax.local_device_count() < num_chains:
+            raise ValueError(f"{num_chains} chains need {num_chains} devices, found {jax.local_device_count()}")
+        self.model = model
+        self.num_warmup = num_warmup
+        self.num_samples = num_samples
+        self.num_chains = num_chains
+        self.chain_method = chain_method
+        self._run_chains = None
+
+    def _compile(self, potential_fn_gen: Callable, postprocess_fn_gen: Callable) -> Callable:
+        init_kernel, sample_kernel = hmc(potential_fn_gen=potential_fn_gen, algo="NUTS")
+        num_warmup, num_samples = self.num_warmup, self.num_samples
+
+        def run_chain(init_params, rng_key, args, kwargs):
+            state = init_kernel(init_params, num_warmup, model_args=args, model_kwargs=kwargs, rng_key=rng_key)
+
+            def body(state, _):
+                state = sample_kernel(state, model_args=args, model_kwargs=kwargs)
+                return state, (state.z, state.diverging)
+
+            state, _ = lax.scan(body, state, None, length=num_warmup)
+            _, (z, diverging) = lax.scan(body, state, None, length=num_samples)
+            return jax.vmap(postprocess_fn_gen(*args, **kwargs))(z), diverging.sum()
+
+        if self.chain_method == "parallel":
+            return jax.pmap(run_chain, in_axes=(0, 0, None, None))
+        return jax.jit(jax.vmap(run_chain, in_axes=(0, 0, None, None)))
+
+    def run(self, rng_key, *args, **kwargs) -> InferenceResult:
+        start = time.perf_counter()
+        rng_init, rng_chains = random.split(rng_key)
+        init_params, potential_fn_gen, postprocess_fn_gen, _ = initialize_model(
+            random.split(rng_init, self.num_chains), self.model,
+            model_args=args, model_kwargs=kwargs, dynamic_args=True,
+        )
+        if self._run_chains is None:
+            self._run_chains = self._compile(potential_fn_gen, postprocess_fn_gen)
+        samples, divergences = self._run_chains(
+            init_params.z, random.split(rng_chains, self.num_chains), args, kwargs,
+        )
+        samples = jax.tree.map(np.asarray, samples)
+        return InferenceResult(samples, time.perf_counter() - start, int(divergences.sum()))
+
+
+def preference_model(data=None):
+    """The model of `02_ppl.ipynb`, with the number of trials of `data` as the
+    total count (numpyro now checks that observations are in the support)."""
+    alpha = numpyro.sample('alpha', dist.Dirichlet(jnp.repeat(1, 4)))
+    total_count = 1 if data is None else jnp.sum(data)
+    numpyro.sample('obs', dist.MultinomialProbs(alpha, total_count=total_count), obs=data)
+
+
+def context_model(mood, weather, obs=None):
+    """The contextual model of `02_ppl.ipynb`, with the total counts of `obs`."""
+    lam = numpyro.sample("lam", dist.Exponential(rate=1.0))
+
+    alpha_mood = numpyro.sample("alpha_mood", dist.Exponential(rate=lam).expand((2, 4)))
+    alpha_weather = numpyro.sample("alpha_weather", dist.Exponential(rate=lam).expand((2, 4)))
+    alpha_0 = jnp.repeat(1, 4)
+
+    total_count = 1 if obs is None else jnp.sum(obs, axis=-1)
+    with numpyro.plate("context", 4):
+        concentration = numpyro.deterministic("concentration", alpha_0 + alpha_mood[mood, :] + alpha_weather[weather, :])
+        probs = numpyro.sample("probs", dist.Dirichlet(concentration=concentration))
+        numpyro.sample("obs", dist.Multinomial(total_count=total_count, probs=probs), obs=obs)
+
+
+def main() -> None:
+    set_host_devices()
+    from online_posterior import model as bandit_model
+
+    rng = np.random.default_rng(0)
+    n = 1000
+    bandit_data = {
+        "mood": jnp.asarray(rng.integers(2, size=n)), "weather": jnp.asarray(rng.integers(2, size=n)),
+        "arm": jnp.asarray(rng.integers(4, size=n)), "obs": jnp.asarray(rng.integers(2, size=n)),
+    }
+    problems = {
+        "02_ppl (preference)": (preference_model, {"data": jnp.array([20, 20, 20, 40])}),
+        "02_ppl (context)": (context_model, {
+            "obs": jnp.array([[0, 0, 15, 10], [15, 5, 0, 5], [0, 0, 5, 20], [5, 15, 0, 5]]),
+            "mood": jnp.array([0, 0, 1, 1]), "weather": jnp.array([0, 1, 0, 1]),
+        }),
+        "02_contextual_bandit": (bandit_model, bandit_data),
+    }
+
+    print(f"Devices: {jax.local_device_count()}")
+    for name, (model, data) in problems.items():
+        # One chain, as in the notebooks.
+        start = time.perf_counter()
+        mcmc = MCMC(NUTS(model), num_warmup=1000, num_samples=2000, thinning=1, progress_bar=False)
+        mcmc.run(random.PRNGKey(12345), **data)
+        samples = jax.tree.map(np.asarray, mcmc.get_samples(group_by_chain=True))
+        elapsed = time.perf_counter() - start
+        single = InferenceResult(samples, elapsed, int(mcmc.get_extra_fields()["diverging"].sum()))
+
+        runner = MCMCRunner(model)
+        first = runner.run(random.PRNGKey(0), **data)
+        second = runner.run(random.PRNGKey(1), **data)
+
+        print(f"{name}:")
+        print(f"  MCMC, 1 chain:            {single.wall_time:6.2f} s, min ESS/s {single.ess_per_second:7.0f}")
+        for label, result in (("first run", first), ("second run", second)):
+            print(f"  MCMCRunner, {runner.num_chains} chains ({runner.chain_method}, {label}): "
+                  f"{result.wall_time:6.2f} s, min ESS/s {result.ess_per_second:7.0f}, "
+                  f"max R-hat {result.max_r_hat:.3f}, divergences {result.num_divergences}")
+
+
+if __name__ == "__main__":
+    main()
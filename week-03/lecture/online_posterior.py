@@ -0,0 +1,311 @@
+"""
+Online posterior updates for the contextual Thompson sampling agent in `02_contextual_bandit.ipynb`.
+
+`estimate_parameters` in the notebook runs a new NUTS chain with 1000 warmup
+and 2000 samples over the whole history each time it is called, so each
+refresh is slower than the last, and the new kernel is compiled every time.
+This module provides two online alternatives. Both return a `Predictive`, like
+`estimate_parameters`, so `ContextualThompsonSampling.get_arm` works unchanged.
+
+* `WarmStartMCMC` runs the warmup once. Later refreshes continue the chain from
+  its last position, keep the adapted mass matrix, and draw a few hundred
+  samples after a short warmup that only tunes the step size. The history is padded to a power-of-two
+  length and the padding is masked out of the likelihood, so the compiled
+  sampler is reused until the history outgrows its bucket.
+* `OnlineLaplace` keeps a Gaussian approximation of the posterior and updates
+  it with one Newton step per observation (an online Laplace approximation).
+  An update costs the same however long the history is.
+
+Both reuse `model` from the notebook.
+"""
+import time
+
+from typing import Dict
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+import numpyro
+import numpyro.distributions as dist
+
+from jax import lax, random
+from jax.flatten_util import ravel_pytree
+from numpyro.infer import MCMC, NUTS, Predictive
+from numpyro.infer.hmc import hmc
+from numpyro.infer.util import initialize_model, log_likelihood
+from numpyro.primitives import Messenger
+
+from history_store import HistorySnapshot, create_contextual_store
+
+invlogit = lambda x: 1 / (1 + jnp.exp(-x))
+
+
+def model(mood, weather, arm, obs=None):
+    alpha_0 = numpyro.sample(
+        "alpha_0",
+        dist.Normal(0, 1.5)
+    )
+    alpha_mood = numpyro.sample(
+        "alpha_mood",
+        dist.Normal(0, 2).expand((2, 4))
+    )
+    alpha_weather = numpyro.sample(
+        "alpha_weather",
+        dist.Normal(0, 2).expand((2, 4))
+    )
+
+    logit_p = alpha_0 + alpha_mood[mood, arm] + alpha_weather[weather, arm]
+    theta = numpyro.deterministic("theta", invlogit(logit_p))
+    numpyro.sample("obs", dist.Binomial(probs=theta), obs=obs)
+
+
+def estimate_parameters(rng_key, history: HistorySnapshot) -> Predictive:
+    """`estimate_parameters` of the notebook, reading a history snapshot."""
+    kernel = NUTS(model)
+    mcmc = MCMC(kernel, num_warmup=1000, num_samples=2000, thinning=1, progress_bar=False)
+    mcmc.run(rng_key, obs=jnp.array(history.rewards), arm=history.arms, mood=history.mood, weather=history.weather)
+    predictive = Predictive(model, mcmc.get_samples())
+    return predictive
+
+
+class mask_observed(Messenger):
+    """Like `numpyro.handlers.mask`, but only for observed sites, so priors with
+    a different batch shape than the data are left alone. Scalar observed sites,
+    like the log-Jacobian factors of constrained priors, are not per-row data
+    and are not masked either."""
+
+    def __init__(self, fn=None, mask=True):
+        self.mask = mask
+        super().__init__(fn)
+
+    def process_message(self, msg):
+        if msg["type"] == "sample" and msg["is_observed"] and jnp.ndim(self.mask) <= len(msg["fn"].batch_shape):
+            msg["fn"] = msg["fn"].mask(self.mask)
+
+
+def padded_data(history: HistorySnapshot, min_length: int = 64) -> Dict[str, jax.Array]:
+    """The history as model arguments padded to a power-of-two length, with a `mask` of the real rows."""
+    n = len(history)
+    length = max(min_length, 1 << max(n - 1, 0).bit_length())
+    data = {}
+    for name, key in (("mood", "mood"), ("weather", "weather"), ("arms", "arm"), ("rewards", "obs")):
+        column = np.zeros(length, dtype=np.int32)
+        column[:n] = getattr(history, name)
+        data[key] = jnp.asarray(column)
+    data["mask"] = jnp.arange(length) < n
+    return data
+
+
+class WarmStartMCMC:
+    def __init__(
+        self,
+        model=model,
+        num_warmup: int = 1000,
+        num_samples: int = 2000,
+        num_refresh_warmup: int = 100,
+        num_refresh_samples: int = 500,
+        min_length: int = 64,
+    ):
+        """
+        num_warmup, num_samples: The first run, as in `estimate_parameters`.
+        num_refresh_warmup: The warmup of each later refresh. It keeps the mass
+            matrix of the first run and only adapts the step size, starting from
+            the adapted one, so a short one is enough to follow the posterior as
+            it narrows.
+        num_refresh_samples: The samples drawn by each later refresh.
+        min_length: The smallest padded history length.
+        """
+        self.model = model
+        self.min_length = min_length
+        self.num_warmup, self.num_samples = num_warmup, num_samples
+        self.num_refresh_warmup, self.num_refresh_samples = num_refresh_warmup, num_refresh_samples
+        self.last_state = None
+        self._first = self._refresh = None
+        self._postprocess_fn_gen = None
+
+    def masked_model(self, mood, weather, arm, obs=None, mask=True):
+        with mask_observed(mask=mask):
+            self.model(mood, weather, arm, obs)
+
+    def _sampler(self, potential_fn_gen, num_warmup: int, num_samples: int):
+        """An `hmc` kernel and a compiled function that runs it. Each kernel always
+        gets the same number of warmup steps, which its compiled run depends on."""
+        init_kernel, sample_kernel = hmc(potential_fn_gen=potential_fn_gen, algo="NUTS")
+
+        @jax.jit
+        def run(state, data):
+            def body(state, _):
+                state = sample_kernel(state, model_kwargs=data)
+                return state, state.z
+
+            state, _ = lax.scan(body, state, None, length=num_warmup)
+            return lax.scan(body, state, None, length=num_samples)
+
+        return init_kernel, run
+
+    def update(self, rng_key, history: HistorySnapshot) -> Predictive:
+        data = padded_data(history, self.min_length)
+        rng_init, rng_key = random.split(rng_key)
+        if self.last_state is None:
+            init_params, potential_fn_gen, self._postprocess_fn_gen, _ = initialize_model(
+                rng_init, self.masked_model, model_kwargs=data, dynamic_args=True,
+            )
+            self._first = self._sampler(potential_fn_gen, self.num_warmup, self.num_samples)
+            self._refresh = self._sampler(potential_fn_gen, self.num_refresh_warmup, self.num_refresh_samples)
+            init_kernel, run = self._first
+            state = init_kernel(init_params.z, self.num_warmup, model_kwargs=data, rng_key=rng_key)
+        else:
+            # Continue from the last position, step size and mass matrix. The
+            # potential energy and its gradient are recomputed for the new history.
+            # Only the step size is adapted again: a short warmup would otherwise
+            # re-estimate the mass matrix from a few dozen draws and overwrite it.
+            init_kernel, run = self._refresh
+            adapt_state = self.last_state.adapt_state
+            state = init_kernel(
+                self.last_state.z, self.num_refresh_warmup,
+                step_size=adapt_state.step_size, inverse_mass_matrix=adapt_state.inverse_mass_matrix,
+                adapt_mass_matrix=False, model_kwargs=data, rng_key=rng_key,
+            )
+        self.last_state, samples = run(state, data)
+        # The sampler works in the unconstrained space; map the latent sites back.
+        constrained = jax.vmap(self._postprocess_fn_gen(**data))(samples)
+        return Predictive(self.model, {name: constrained[name] for name in samples})
+
+
+class OnlineLaplace:
+    """A Gaussian approximation N(mean, precision^-1) of the posterior over the
+    flattened latent sites, starting from the prior. All latent sites must be
+    real-valued (true for `model`, whose priors are normal)."""
+
+    def __init__(self, model=model, rng_key=None):
+        self.model = model
+        rng_key = random.PRNGKey(0) if rng_key is None else rng_key
+        trace = numpyro.handlers.trace(numpyro.handlers.seed(model, rng_key)).get_trace(
+            mood=jnp.zeros(1, dtype=jnp.int32), weather=jnp.zeros(1, dtype=jnp.int32),
+            arm=jnp.zeros(1, dtype=jnp.int32),
+        )
+        latent = {
+            name: site["fn"] for name, site in trace.items()
+            if site["type"] == "sample" and not site["is_observed"] and name != "obs"
+        }
+        for name, fn in latent.items():
+            if fn.support is not dist.constraints.real:
+                raise ValueError(f"Site {name} is not real-valued")
+        moment = lambda value, fn: jnp.broadcast_to(value, fn.shape()).astype(jnp.result_type(float))
+        self.mean, self._unravel = ravel_pytree({name: moment(fn.mean, fn) for name, fn in latent.items()})
+        variance, _ = ravel_pytree({name: moment(fn.variance, fn) for name, fn in latent.items()})
+        self.precision = jnp.diag(1 / variance)
+        self.count = 0
+        self._update = jax.jit(self._newton_step)
+
+    def _log_likelihood(self, z, mood, weather, arm, reward):
+        ll = log_likelihood(
+            self.model, self._unravel(z), mood=mood, weather=weather, arm=arm, obs=reward, batch_ndims=0,
+        )
+        return ll["obs"].sum()
+
+    def _newton_step(self, mean, precision, mood, weather, arm, reward):
+        args = (jnp.atleast_1d(mood), jnp.atleast_1d(weather), jnp.atleast_1d(arm), jnp.atleast_1d(reward))
+        grad = jax.grad(self._log_likelihood)(mean, *args)
+        hessian = jax.hessian(self._log_likelihood)(mean, *args)
+        precision = precision - hessian
+        mean = mean + jnp.linalg.solve(precision, grad)
+        return mean, precision
+
+    def observe(self, arm: int, mood: int, weather: int, reward: int) -> None:
+        args = np.array([mood, weather, arm, reward], dtype=np.int32)
+        self.mean, self.precision = self._update(self.mean, self.precision, *args)
+        self.count += 1
+
+    def predictive(self, rng_key, num_samples: int = 2000) -> Predictive:
+        chol = jnp.linalg.cholesky(jnp.linalg.inv(self.precision))
+        eps = random.normal(rng_key, (num_samples, self.mean.shape[0]))
+        z = self.mean + eps @ chol.T
+        return Predictive(self.model, jax.vmap(self._unravel)(z))
+
+
+def posterior_mean_theta(rng_key, predictive: Predictive) -> np.ndarray:
+    """The mean theta of every (mood, weather) context and arm, like `print_theta`."""
+    thetas = []
+    for m, w in [(0, 0), (0, 1), (1, 0), (1, 1)]:
+        rng_key, rng_key_ = random.split(rng_key)
+        pred = predictive(rng_key_, arm=jnp.arange(4), mood=jnp.array([m]), weather=jnp.array([w]))
+        thetas.append(np.asarray(jnp.mean(pred["theta"], axis=0)))
+    return np.array(thetas)
+
+
+def main() -> None:
+    thetas = np.array([[1e-3, 1e-3, 0.60, 0.40],  # active, rainy
+                       [0.60, 0.20, 1e-3, 0.20],  # active, sunny
+                       [1e-3, 1e-3, 0.20, 0.80],  # chill, rainy
+                       [0.20, 0.60, 1e-3, 0.20]])  # chill, sunny
+    rng = np.random.default_rng(0)
+    rng_key = random.PRNGKey(12345)
+
+    n_total = 4000
+    checkpoints = [100, 500, 1000, 2000, 4000]
+    store = create_contextual_store()
+    warm = WarmStartMCMC()
+    laplace = OnlineLaplace()
+
+    def block(predictive: Predictive) -> None:
+        jax.block_until_ready(predictive.posterior_samples)
+
+    # Start the online estimators (the first warmup and compilation).
+    rng_key, rng_key_ = random.split(rng_key)
+    block(warm.update(rng_key_, store.snapshot()))
+    prior = laplace.mean, laplace.precision
+    laplace.observe(0, 0, 0, 0)
+    block(laplace.predictive(rng_key_))
+    (laplace.mean, laplace.precision), laplace.count = prior, 0
+
+    print("Time to refresh the posterior (decision latency when refreshing before each decision):")
+    # The warm-started sampler is compiled again when the history outgrows its
+    # bucket; the second refresh shows the cost within a bucket.
+    print(f"{'history':>8} {'full MCMC':>11} {'warm (new bucket)':>18} {'warm':>8} "
+          f"{'Laplace/obs':>12} {'Laplace draw':>13}")
+    observe_time = 0.0
+    for t in range(n_total):
+        mood, weather, arm = rng.integers(2), rng.integers(2), rng.integers(4)
+        reward = int(rng.random() < thetas[mood * 2 + weather, arm])
+        store.append(mood=mood, weather=weather, arms=arm, rewards=reward)
+        start = time.perf_counter()
+        laplace.observe(arm, mood, weather, reward)
+        jax.block_until_ready(laplace.mean)
+        observe_time += time.perf_counter() - start
+
+        if t + 1 not in checkpoints:
+            continue
+        history = store.snapshot()
+
+        rng_key, rng_key_ = random.split(rng_key)
+        start = time.perf_counter()
+        block(estimate_parameters(rng_key_, history))
+        elapsed_full = time.perf_counter() - start
+
+        elapsed_warm = []
+        for _ in range(2):
+            rng_key, rng_key_ = random.split(rng_key)
+            start = time.perf_counter()
+            warm_predictive = warm.update(rng_key_, history)
+            block(warm_predictive)
+            elapsed_warm.append(time.perf_counter() - start)
+
+        rng_key, rng_key_ = random.split(rng_key)
+        start = time.perf_counter()
+        laplace_predictive = laplace.predictive(rng_key_)
+        block(laplace_predictive)
+        elapsed_draw = time.perf_counter() - start
+
+        print(f"{t + 1:>8} {elapsed_full:>9.2f} s {elapsed_warm[0]:>16.2f} s {elapsed_warm[1]:>6.2f} s "
+              f"{observe_time / (t + 1) * 1e3:>9.2f} ms {elapsed_draw * 1e3:>10.2f} ms")
+
+    rng_key, rng_key_ = random.split(rng_key)
+    np.set_printoptions(precision=2, suppress=True)
+    print(f"True thetas:\n{thetas}")
+    print(f"Warm-started MCMC:\n{posterior_mean_theta(rng_key_, warm_predictive)}")
+    print(f"Online Laplace:\n{posterior_mean_theta(rng_key_, laplace_predictive)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+A cached posterior-predictive table for `ContextualThompsonSampling` in `02_contextual_bandit.ipynb`.
+
+`get_arm` in the notebook runs `Predictive` over all posterior samples for
+every decision, only to use one random row of `theta`. Here, `theta` is
+computed once per posterior refresh for every context (indexed with `ctx2idx`
+from `02_ppl.ipynb`) and arm, and the best arm of each sample and context is
+stored as well. A decision is then a random sample index and a table lookup,
+and the decisions of a whole batch of users are one indexing operation.
+"""
+import time
+
+from typing import Optional
+
+import jax.numpy as jnp
+import numpy as np
+
+from jax import random
+from numpyro.infer import Predictive
+
+MOODS = ["active", "chill"]
+WEATHERS = ["rainy", "sunny"]
+ARMS = ["cycling", "picnic", "climbing", "movie"]
+
+
+def ctx2idx(mood: str, weather: str) -> int:
+    m = 2 if mood == "chill" else 0
+    w = 1 if weather == "sunny" else 0
+    return m + w
+
+
+class ThetaTable:
+    def __init__(self, thetas: np.ndarray):
+        """thetas: (samples, contexts, arms), the theta of each posterior sample."""
+        self.thetas = thetas
+        self.best_arms = np.argmax(thetas, axis=2).astype(np.int8)  # (samples, contexts)
+
+    @classmethod
+    def from_predictive(cls, rng_key, predictive: Predictive) -> "ThetaTable":
+        """Evaluate `predictive` once for every (mood, weather, arm)."""
+        contexts = [(m, w) for m in range(len(MOODS)) for w in range(len(WEATHERS))]
+        mood = jnp.repeat(jnp.array([m for m, _ in contexts]), len(ARMS))
+        weather = jnp.repeat(jnp.array([w for _, w in contexts]), len(ARMS))
+        arm = jnp.tile(jnp.arange(len(ARMS)), len(contexts))
+        theta = predictive(rng_key, arm=arm, mood=mood, weather=weather)["theta"]
+        # The contexts are in `ctx2idx` order: mood * 2 + weather.
+        return cls(np.asarray(theta).reshape(-1, len(contexts), len(ARMS)))
+
+    @property
+    def n_samples(self) -> int:
+        return self.thetas.shape[0]
+
+    def get_arm(self, mood: int, weather: int, rng: Optional[np.random.Generator] = None) -> int:
+        """The arm of one Thompson sampling decision in context (mood, weather)."""
+        sample = np.random.randint(0, self.n_samples) if rng is None else rng.integers(self.n_samples)
+        return int(self.best_arms[sample, mood * 2 + weather])
+
+    def get_arms(self, moods: np.ndarray, weathers: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """Independent Thompson sampling decisions for a batch of users' contexts."""
+        samples = rng.integers(self.n_samples, size=len(moods))
+        return self.best_arms[samples, np.asarray(moods) * 2 + np.asarray(weathers)]
+
+    def mean(self) -> np.ndarray:
+        """The mean theta of each context and arm (contexts, arms), like `print_theta`."""
+        return self.thetas.mean(axis=0)
+
+
+def main() -> None:
+    from online_posterior import OnlineLaplace
+
+    thetas = np.array([[1e-3, 1e-3, 0.60, 0.40],  # active, rainy
+                       [0.60, 0.20, 1e-3, 0.20],  # active, sunny
+                       [1e-3, 1e-3, 0.20, 0.80],  # chill, rainy
+                       [0.20, 0.60, 1e-3, 0.20]])  # chill, sunny
+    rng = np.random.default_rng(0)
+    rng_key = random.PRNGKey(12345)
+
+    # A posterior after 2000 random trials.
+    laplace = OnlineLaplace()
+    for _ in range(2000):
+        mood, weather, arm = rng.integers(2), rng.integers(2), rng.integers(4)
+        reward = int(rng.random() < thetas[mood * 2 + weather, arm])
+        laplace.observe(arm, mood, weather, reward)
+    rng_key, rng_key_ = random.split(rng_key)
+    predictive = laplace.predictive(rng_key_, num_samples=2000)
+
+    def get_arm(rng_key, predictive: Predictive, mood: int, weather: int, sample: int) -> int:
+        # `ContextualThompsonSampling.get_arm`, with the random row given.
+        pred = predictive(rng_key, arm=[0, 1, 2, 3], mood=jnp.array([mood]), weather=jnp.array([weather]))
+        theta = pred["theta"][sample]
+        return int(np.argmax(theta))
+
+    n_decisions = 50
+    moods, weathers = rng.integers(2, size=n_decisions), rng.integers(2, size=n_decisions)
+    samples = rng.integers(2000, size=n_decisions)
+    get_arm(rng_key, predictive, 0, 0, 0)  # Compile
+
+    start = time.perf_counter()
+    expected = [get_arm(rng_key, predictive, m, w, s) for m, w, s in zip(moods, weathers, samples)]
+    elapsed_predictive = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = ThetaTable.from_predictive(rng_key, predictive)
+    elapsed_build = time.perf_counter() - start
+
+    arms = [int(table.best_arms[s, ctx2idx(MOODS[m], WEATHERS[w])]) for m, w, s in zip(moods, weathers, samples)]
+    print(f"Same arms as Predictive per decision: {arms == expected}")
+
+    start = time.perf_counter()
+    for m, w in zip(moods, weathers):
+        table.get_arm(m, w, rng)
+    elapsed_table = time.perf_counter() - start
+
+    n_users = 1_000_000
+    batch_moods, batch_weathers = rng.integers(2, size=n_users), rng.integers(2, size=n_users)
+    start = time.perf_counter()
+    batch_arms = table.get_arms(batch_moods, batch_weathers, rng)
+    elapsed_batch = time.perf_counter() - start
+
+    print(f"Predictive per decision: {elapsed_predictive * 1e3 / n_decisions:.2f} ms/decision")
+    print(f"Building the table:      {elapsed_build * 1e3:.2f} ms (once per posterior refresh)")
+    print(f"Table, one decision:     {elapsed_table * 1e6 / n_decisions:.2f} us/decision")
+    print(f"Table, batch of {n_users}: {elapsed_batch * 1e3:.1f} ms ({elapsed_batch * 1e9 / n_users:.1f} ns/decision)")
+
+    np.set_printoptions(precision=2, suppress=True)
+    for mood in MOODS:
+        for weather in WEATHERS:
+            ctx = ctx2idx(mood, weather)
+            chosen = np.bincount(batch_arms[batch_moods * 2 + batch_weathers == ctx], minlength=len(ARMS))
+            print(f"{mood}, {weather}: mean theta {table.mean()[ctx]}, "
+                  f"choices {dict(zip(ARMS, (chosen / chosen.sum()).round(2).tolist()))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Batch Bayesian optimization with parallel evaluations for the BO loop of `03_bo.ipynb`.
+
+The loop in the exercise proposes one point, evaluates `sample_from_some_function`,
+and only then proposes the next point. When the objective is an expensive
+user simulation, the other cores sit idle. Here:
+
+* `propose_batch` picks q points with Monte Carlo q-expected improvement
+  (q-EI) over a grid of candidates. Joint samples of the GP posterior at the
+  candidates are drawn once; points are then added greedily, each one
+  maximizing the expected improvement of the best value of the batch so far
+  plus that point, averaged over the samples.
+* `optimize` keeps q evaluations running in a process pool. As soon as one
+  finishes, its result is added to the GP posterior and a replacement point is
+  proposed, treating the points still being evaluated as part of the batch.
+  The workers therefore never wait for the slowest evaluation of a round.
+"""
+import time
+
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from gp_posterior import GPPosterior
+
+
+def propose_batch(
+    gp: GPPosterior,
+    candidates: np.ndarray,
+    q: int,
+    rng: np.random.Generator,
+    pending: Sequence[int] = (),
+    n_samples: int = 512,
+) -> List[int]:
+    """
+    The indices of q candidates chosen greedily by Monte Carlo q-EI.
+
+    pending: Indices of candidates that are being evaluated; they count as
+        already in the batch, so new points are not proposed next to them.
+    """
+    f = gp.sample(rng, candidates, size=n_samples)  # (samples, candidates)
+    best = gp.Y.max()
+    batch_max = f[:, list(pending)].max(axis=1) if len(pending) else np.full(n_samples, -np.inf)
+    chosen: List[int] = []
+    for _ in range(q):
+        improvement = np.maximum(np.maximum(batch_max[:, None], f) - best, 0).mean(axis=0)
+        improvement[list(pending) + chosen] = -np.inf
+        i = int(np.argmax(improvement))
+        chosen.append(i)
+        batch_max = np.maximum(batch_max, f[:, i])
+    return chosen
+
+
+@dataclass
+class BOResult:
+    X: np.ndarray
+    Y: np.ndarray
+    wall_time: float
+    x_best: float  # The candidate with the highest posterior mean
+    order: List[int] = field(default_factory=list)  # Evaluations in the order they finished
+
+
+def optimize(
+    objective: Callable[[float], float],
+    gp: GPPosterior,
+    candidates: np.ndarray,
+    n_evaluations: int,
+    q: int,
+    executor: Executor,
+    rng: np.random.Generator,
+) -> BOResult:
+    """Evaluate `objective` n_evaluations times, with up to q evaluations running at once."""
+    start = time.perf_counter()
+    pending: Dict = {}
+    submitted = 0
+    order = []
+    while submitted < n_evaluations or pending:
+        n_new = min(q - len(pending), n_evaluations - submitted)
+        if n_new > 0:
+            for i in propose_batch(gp, candidates, n_new, rng, pending=list(pending.values())):
+                pending[executor.submit(objective, candidates[i])] = i
+            submitted += n_new
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            i = pending.pop(future)
+            gp.append(candidates[i], future.result())
+            order.append(i)
+    x_best = float(candidates[np.argmax(gp.mean(candidates))])
+    return BOResult(gp.X[:, 0].copy(), gp.Y.copy(), time.perf_counter() - start, x_best, order)
+
+
+def some_function(x: float) -> float:
+    assert np.all(-4 < x)
+    return -0.5 * x**2 + 2 * np.log(x + 4)
+
+
+def expensive_simulation(x: float, delay: float = 0.2) -> float:
+    """`sample_from_some_function` of the exercise that takes `delay` seconds or
+    more, like a simulated user session."""
+    rng = np.random.default_rng()
+    time.sleep(delay * rng.uniform(1, 2))
+    return rng.normal(some_function(x), 0.3)
+
+
+def main() -> None:
+    var, length, noise = 3.0, 1.0, 0.09
+    candidates = np.linspace(-3, 3, 200)
+    x_star = -2 + np.sqrt(6)  # The maximum of some_function
+    n_evaluations = 24
+
+    def initial_gp() -> GPPosterior:
+        # The initial dataset of the exercise.
+        gp = GPPosterior(var, length, noise)
+        x = np.array([-3, 0, 2])
+        gp.extend(x, np.random.default_rng(0).normal(some_function(x), 0.3))
+        return gp
+
+    for q in (1, 2, 4, 8):
+        with ProcessPoolExecutor(max_workers=q) as executor:
+            result = optimize(
+                expensive_simulation, initial_gp(), candidates, n_evaluations, q, executor, np.random.default_rng(1),
+            )
+        print(f"q={q}: {n_evaluations} evaluations in {result.wall_time:.2f} s, "
+              f"best x {result.x_best:.3f} (true {x_star:.3f})")
+
+    # The first batch of four points from the initial data.
+    chosen = propose_batch(initial_gp(), candidates, 4, np.random.default_rng(2))
+    print(f"First batch: {np.round(candidates[chosen], 2).tolist()}")
+
+
+if __name__ == "__main__":
+    main()
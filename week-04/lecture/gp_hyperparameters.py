@@ -0,0 +1,224 @@
+"""
+Warm-started, compiled GP hyperparameter fitting for the BO loop of `03_bo.ipynb`.
+
+Each iteration of the exercise creates a new `SVI` with a new
+`AutoLaplaceApproximation` guide and runs 1000 Adam steps from the default
+initialization. One more observation changes the shape of `X` and `Y`, so
+`svi.run` traces and compiles the model again, and the compilation costs far
+more than the steps themselves.
+
+`HyperparameterFitter` pads the observations to a power-of-two length with a
+mask. The padded rows of the kernel matrix are rows of the identity and the
+padded targets are 0, so they add only a constant to the log density, which
+is subtracted with a `numpyro.factor`; the ELBO is the same as without padding.
+The optimization runs inside one compiled `lax.while_loop` per padded length:
+blocks of `check_every` Adam steps, until the mean loss of a block changes by
+less than `tol` or `max_steps` is reached. Each fit starts from the
+optimum of the previous one, which after one new observation is already close,
+so it usually stops after a block or two.
+"""
+import math
+import time
+
+from typing import Dict, Tuple
+
+import jax
+import jax.numpy as jnp
+import jax.random as random
+import numpy as np
+import numpyro
+import numpyro.distributions as dist
+import numpyro.optim as optim
+
+from jax import lax
+from jax.flatten_util import ravel_pytree
+from numpyro.distributions.util import cholesky_of_inverse
+from numpyro.infer import SVI, Trace_ELBO
+from numpyro.infer.autoguide import AutoLaplaceApproximation
+from numpyro.infer.svi import SVIState
+from numpyro.infer.util import constrain_fn, potential_energy, unconstrain_fn
+
+
+# squared exponential kernel with diagonal noise term
+def kernel(X, Z, var, length, noise, jitter=1.0e-6, include_noise=True):
+    deltaXsq = jnp.power((X[:, None] - Z) / length, 2.0)
+    k = var * jnp.exp(-0.5 * deltaXsq)
+    if include_noise:
+        k += (noise + jitter) * jnp.eye(X.shape[0])
+    return k
+
+
+def model(X, Y):
+    # set uninformative log-normal priors on our three kernel hyperparameters
+    var = numpyro.sample("kernel_var", dist.LogNormal(0.0, 10.0))
+    noise = numpyro.sample("kernel_noise", dist.LogNormal(0.0, 10.0))
+    length = numpyro.sample("kernel_length", dist.LogNormal(0.0, 10.0))
+
+    # compute kernel
+    k = kernel(X, X, var, length, noise)
+
+    # sample Y according to the standard gaussian process formula
+    numpyro.sample("Y", dist.MultivariateNormal(loc=jnp.zeros(X.shape[0]), covariance_matrix=k), obs=Y)
+
+
+def masked_model(X, Y, mask):
+    """`model` of padded observations; `mask` marks the real ones."""
+    var = numpyro.sample("kernel_var", dist.LogNormal(0.0, 10.0))
+    noise = numpyro.sample("kernel_noise", dist.LogNormal(0.0, 10.0))
+    length = numpyro.sample("kernel_length", dist.LogNormal(0.0, 10.0))
+
+    both = mask[:, None] & mask[None, :]
+    k = jnp.where(both, kernel(X, X, var, length, noise), jnp.eye(X.shape[0]))
+    numpyro.sample("Y", dist.MultivariateNormal(loc=jnp.zeros(X.shape[0]), covariance_matrix=k), obs=Y)
+    # Each padded row adds log N(0 | 0, 1).
+    numpyro.factor("padding", 0.5 * math.log(2 * math.pi) * jnp.sum(~mask))
+
+
+def padded_data(X, Y, min_length: int = 8) -> Tuple[jax.Array, jax.Array, jax.Array]:
+    """X and Y padded with zeros to a power-of-two length, and a mask of the real rows."""
+    n = len(X)
+    length = max(min_length, 1 << max(n - 1, 0).bit_length())
+    X_padded, Y_padded = np.zeros(length), np.zeros(length)
+    X_padded[:n], Y_padded[:n] = X, Y
+    return jnp.asarray(X_padded), jnp.asarray(Y_padded), jnp.arange(length) < n
+
+
+class HyperparameterFitter:
+    def __init__(
+        self,
+        learning_rate: float = 0.1,
+        max_steps: int = 1000,
+        check_every: int = 50,
+        tol: float = 1.0e-3,
+        min_length: int = 8,
+    ):
+        """
+        learning_rate, max_steps: Adam's, as in the exercise.
+        check_every: The number of steps between convergence checks.
+        tol: Stop when the mean loss (in nats) of a block of steps changes by
+            less than this.
+        min_length: The smallest padded number of observations.
+        """
+        self.max_steps, self.check_every, self.tol = max_steps, check_every, tol
+        self.min_length = min_length
+        self.guide = AutoLaplaceApproximation(masked_model)
+        self.svi = SVI(masked_model, self.guide, optim.Adam(learning_rate), Trace_ELBO())
+        self.params = None
+        self.num_steps = 0  # Of the last fit
+        self.loss = None  # The mean loss of the last block of steps of the last fit
+        self._data = None
+        self._run = jax.jit(self._optimize)
+
+    def _optimize(self, state: SVIState, X, Y, mask):
+        def block(state):
+            def step(state, _):
+                return self.svi.update(state, X, Y, mask)
+
+            state, losses = lax.scan(step, state, None, length=self.check_every)
+            return state, jnp.mean(losses)
+
+        def cond(carry):
+            _, steps, previous, loss = carry
+            converged = jnp.abs(previous - loss) < self.tol
+            return (steps < self.max_steps) & ~converged
+
+        def body(carry):
+            state, steps, _, previous = carry
+            state, loss = block(state)
+            return state, steps + self.check_every, previous, loss
+
+        state, loss = block(state)
+        state, steps, _, loss = lax.while_loop(cond, body, (state, self.check_every, jnp.inf, loss))
+        return state, steps, loss
+
+    def fit(self, rng_key, X, Y) -> Dict[str, jax.Array]:
+        """The MAP hyperparameters, in the unconstrained space of the guide."""
+        self._data = padded_data(X, Y, self.min_length)
+        if self.params is None:
+            state = self.svi.init(rng_key, *self._data)
+        else:
+            # Start from the last optimum with a fresh optimizer state.
+            state = SVIState(self.svi.optim.init(self.params), None, rng_key)
+        state, steps, loss = self._run(state, *self._data)
+        self.params = self.svi.get_params(state)
+        self.num_steps, self.loss = int(steps), float(loss)
+        return self.params
+
+    def median(self) -> Dict[str, jax.Array]:
+        """The MAP kernel_var, kernel_noise and kernel_length."""
+        return self.guide.median(self.params)
+
+    def sample_posterior(self, rng_key, num_samples: int) -> Dict[str, jax.Array]:
+        """
+        Samples of the Laplace approximation, like `guide.sample_posterior` in
+        the exercise. The guide computes the Hessian with the data it was first
+        called with, so here it is computed with the data of the last fit.
+        """
+        # The Hessian of the potential energy (the negative log joint in the
+        # unconstrained space) at the MAP, as in AutoLaplaceApproximation.
+        loc, unravel = ravel_pytree(unconstrain_fn(masked_model, self._data, {}, self.median()))
+        precision = jax.hessian(lambda z: potential_energy(masked_model, self._data, {}, unravel(z)))(loc)
+        scale_tril = cholesky_of_inverse(precision)
+        latent = loc + random.normal(rng_key, (num_samples,) + loc.shape) @ scale_tril.T
+        return jax.vmap(lambda z: constrain_fn(masked_model, self._data, {}, unravel(z)))(latent)
+
+
+def main() -> None:
+    from gp_posterior import GPPosterior
+
+    def some_function(x):
+        return -0.5 * x**2 + 2 * np.log(x + 4)
+
+    rng = np.random.default_rng(0)
+    rng_key = random.PRNGKey(123)
+    candidates = np.linspace(-3, 3, 100)
+    x = np.array([-3.0, 0.0, 2.0])
+    y = rng.normal(some_function(x), 0.3)
+    n_iterations = 40
+
+    # A BO loop with Thompson sampling at the MAP hyperparameters; only the fitting is timed.
+    fitter = HyperparameterFitter()
+    times_notebook, times_fitter, steps, gaps = [], [], [], []
+    for _ in range(n_iterations):
+        X, Y = jnp.array(x), jnp.array(y)
+
+        # The exercise: a new guide and SVI each iteration.
+        rng_key, rng_key_ = random.split(rng_key)
+        start = time.perf_counter()
+        guide = AutoLaplaceApproximation(model)
+        svi = SVI(model, guide, optim.Adam(0.1), Trace_ELBO(), X=X, Y=Y)
+        svi_result = svi.run(rng_key_, 1000, progress_bar=False)
+        jax.block_until_ready(guide.median(svi_result.params))
+        times_notebook.append(time.perf_counter() - start)
+
+        rng_key, rng_key_ = random.split(rng_key)
+        start = time.perf_counter()
+        fitter.fit(rng_key_, x, y)
+        hyperparameters = jax.block_until_ready(fitter.median())
+        times_fitter.append(time.perf_counter() - start)
+        steps.append(fitter.num_steps)
+        gaps.append(fitter.loss - float(svi_result.losses[-1]))
+
+        gp = GPPosterior(*(float(hyperparameters[name]) for name in ("kernel_var", "kernel_length", "kernel_noise")))
+        gp.extend(x, y)
+        x_next = candidates[np.argmax(gp.sample(rng, candidates))]
+        x = np.append(x, x_next)
+        y = np.append(y, rng.normal(some_function(x_next), 0.3))
+
+    def report(name, times):
+        print(f"{name:<32} first {times[0] * 1e3:7.1f} ms, then mean {np.mean(times[1:]) * 1e3:7.1f} ms, "
+              f"total {np.sum(times):6.2f} s")
+
+    print(f"{n_iterations} BO iterations, {len(x) - n_iterations} to {len(x) - 1} observations:")
+    report("New AutoLaplace + SVI (1000 steps)", times_notebook)
+    report("HyperparameterFitter", times_fitter)
+    print(f"Fitter steps per iteration: first {steps[0]}, then mean {np.mean(steps[1:]):.0f}")
+    print(f"Final loss minus the exercise's: max {max(gaps):.3f}, median {np.median(gaps):.4f} nats")
+
+    rng_key, rng_key_ = random.split(rng_key)
+    samples = fitter.sample_posterior(rng_key_, 1000)
+    print("Posterior means: " + ", ".join(f"{name} {float(jnp.mean(value)):.3f}" for name, value in samples.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+A Gaussian process posterior with a cached Cholesky factor, for `02_gp_ppl.ipynb` and the BO loop of `03_bo.ipynb`.
+
+`predict` in the notebooks computes `jnp.linalg.inv(k_XX)` from scratch on
+every call, which costs O(n^3), is numerically fragile, and (under `jax.jit`)
+compiles again whenever a new observation changes the shape of `X`.
+`GPPosterior` keeps the lower Cholesky factor L of K_XX = K(X, X) + noise I
+and the vector L^-1 Y. Appending an observation x adds one row to L:
+
+    l = L^-1 k(X, x),   d = sqrt(k(x, x) + noise - l.l)
+
+which costs O(n^2). L is stored in a buffer that doubles in size when full,
+so appending does not copy it. Predictions for any batch of test points reuse
+the factor: the mean is k(X_test, X) K_XX^-1 Y and the variance uses
+L^-1 k(X, X_test), both from triangular solves.
+
+The kernel is `kernel` of the notebooks (squared exponential plus noise);
+other kernels from `kernels.py` can be passed.
+"""
+import time
+
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from scipy.linalg import solve_triangular
+
+from kernels import exp_quad
+
+
+class GPPosterior:
+    def __init__(
+        self,
+        var: float,
+        length: float,
+        noise: float,
+        jitter: float = 1.0e-6,
+        kernel: Callable[..., np.ndarray] = exp_quad,
+        capacity: int = 64,
+    ):
+        """var, length, noise: The kernel hyperparameters, as in `kernel` of the notebooks."""
+        self.var, self.length, self.noise, self.jitter = var, length, noise, jitter
+        self.kernel = kernel
+        self.n = 0
+        self.dim: Optional[int] = None
+        self._X = np.empty((0, 0))
+        self._Y = np.empty(0)
+        self._L = np.zeros((0, 0))
+        self._v = np.empty(0)  # L^-1 Y
+        self._alpha: Optional[np.ndarray] = None  # K_XX^-1 Y, computed when needed
+        self._capacity = capacity
+
+    @property
+    def X(self) -> np.ndarray:
+        return self._X[:self.n]
+
+    @property
+    def Y(self) -> np.ndarray:
+        return self._Y[:self.n]
+
+    @property
+    def L(self) -> np.ndarray:
+        return self._L[:self.n, :self.n]
+
+    def _k(self, x1: np.ndarray, x2: np.ndarray) -> np.ndarray:
+        return self.kernel(x1, x2, var=self.var, length=self.length)
+
+    def _grow(self, required: int) -> None:
+        capacity = max(self._capacity, len(self._Y))
+        while capacity < required:
+            capacity *= 2
+        X, Y, L, v = (np.empty((capacity, self.dim)), np.empty(capacity),
+                      np.zeros((capacity, capacity)), np.empty(capacity))
+        n = self.n
+        if n:
+            X[:n], Y[:n], L[:n, :n], v[:n] = self.X, self.Y, self.L, self._v[:n]
+        self._X, self._Y, self._L, self._v = X, Y, L, v
+
+    def append(self, x, y: float) -> None:
+        """Add one observation in O(n^2)."""
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64)).reshape(1, -1)
+        if self.dim is None:
+            self.dim = x.shape[1]
+        if self.n == len(self._Y):
+            self._grow(self.n + 1)
+        n = self.n
+        k = self._k(self.X, x)[:, 0]
+        c = self._k(x, x)[0, 0] + self.noise + self.jitter
+        l = solve_triangular(self.L, k, lower=True, check_finite=False) if n else k
+        d = np.sqrt(max(c - l @ l, self.jitter))
+        self._L[n, :n] = l
+        self._L[n, n] = d
+        self._v[n] = (y - l @ self._v[:n]) / d
+        self._X[n] = x[0]
+        self._Y[n] = y
+        self.n = n + 1
+        self._alpha = None
+
+    def extend(self, X, Y) -> None:
+        X = np.asarray(X, dtype=np.float64)
+        for x, y in zip(X.reshape(len(X), -1), np.asarray(Y, dtype=np.float64)):
+            self.append(x, y)
+
+    def _test_points(self, X_test) -> np.ndarray:
+        X_test = np.asarray(X_test, dtype=np.float64)
+        return X_test.reshape(len(X_test), -1)
+
+    def mean(self, X_test) -> np.ndarray:
+        if self._alpha is None:
+            self._alpha = solve_triangular(self.L, self._v[:self.n], lower=True, trans="T", check_finite=False)
+        return self._k(self._test_points(X_test), self.X) @ self._alpha
+
+    def predict(self, X_test, include_noise: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """The posterior mean and variance at each test point. With `include_noise`,
+        the variance is that of a new observation, as in the notebooks."""
+        X_test = self._test_points(X_test)
+        W = solve_triangular(self.L, self._k(self.X, X_test), lower=True, check_finite=False)  # L^-1 k(X, X_test)
+        prior = self.var + (self.noise + self.jitter if include_noise else 0.0)
+        variance = np.maximum(prior - (W ** 2).sum(axis=0), 0.0)
+        return self.mean(X_test), variance
+
+    def variance(self, X_test, include_noise: bool = True) -> np.ndarray:
+        return self.predict(X_test, include_noise)[1]
+
+    def sample(self, rng: np.random.Generator, X_test, size: int = 1, include_noise: bool = False) -> np.ndarray:
+        """Joint samples (size, n_test) of the function (or of new observations) at the test points."""
+        X_test = self._test_points(X_test)
+        W = solve_triangular(self.L, self._k(self.X, X_test), lower=True, check_finite=False)
+        cov = self._k(X_test, X_test) - W.T @ W
+        cov[np.diag_indices_from(cov)] += self.jitter + (self.noise if include_noise else 0.0)
+        chol = np.linalg.cholesky(cov)
+        return self.mean(X_test) + rng.standard_normal((size, len(X_test))) @ chol.T
+
+
+def main() -> None:
+    import jax
+    import jax.numpy as jnp
+
+    def kernel(X, Z, var, length, noise, jitter=1.0e-6, include_noise=True):
+        deltaXsq = jnp.power((X[:, None] - Z) / length, 2.0)
+        k = var * jnp.exp(-0.5 * deltaXsq)
+        if include_noise:
+            k += (noise + jitter) * jnp.eye(X.shape[0])
+        return k
+
+    @jax.jit
+    def predict(rng_key, X, Y, X_test, var, length, noise):
+        # `predict` of `03_bo.ipynb`.
+        k_pp = kernel(X_test, X_test, var, length, noise, include_noise=True)
+        k_pX = kernel(X_test, X, var, length, noise, include_noise=False)
+        k_XX = kernel(X, X, var, length, noise, include_noise=True)
+        K_xx_inv = jnp.linalg.inv(k_XX)
+        K = k_pp - jnp.matmul(k_pX, jnp.matmul(K_xx_inv, jnp.transpose(k_pX)))
+        sigma_noise = jnp.sqrt(jnp.clip(jnp.diag(K), 0.0)) * jax.random.normal(
+            rng_key, X_test.shape[:1]
+        )
+        mean = jnp.matmul(k_pX, jnp.matmul(K_xx_inv, Y))
+        return mean, mean + sigma_noise, jnp.diag(K)
+
+    def some_function(x):
+        return -0.5 * x**2 + 2 * np.log(x + 4)
+
+    var, length, noise = 3.0, 1.0, 0.09
+    rng = np.random.default_rng(0)
+    X_test = np.linspace(-3, 3, 100)
+    n_total = 2000
+    xs = rng.uniform(-3, 3, n_total)
+    ys = rng.normal(some_function(xs), 0.3)
+
+    # One BO iteration: add an observation, then predict over the test grid.
+    gp = GPPosterior(var, length, noise)
+    times = {}
+    checkpoints = [50, 200, 500, 1000, 2000]
+    for i in range(n_total):
+        start = time.perf_counter()
+        gp.append(xs[i], ys[i])
+        mean, variance = gp.predict(X_test)
+        elapsed = time.perf_counter() - start
+        if i + 1 in checkpoints:
+            times[i + 1] = elapsed
+
+    print(f"{'n':>6} {'inv (jit, new shape)':>21} {'inv (jit, compiled)':>20} {'GPPosterior':>12} {'max |diff|':>11}")
+    key = jax.random.PRNGKey(0)
+    for n in checkpoints:
+        X, Y = jnp.asarray(xs[:n]), jnp.asarray(ys[:n])
+        start = time.perf_counter()
+        jax.block_until_ready(predict(key, X, Y, jnp.asarray(X_test), var, length, noise))
+        elapsed_new = time.perf_counter() - start
+        start = time.perf_counter()
+        expected_mean, _, expected_var = jax.block_until_ready(
+            predict(key, X, Y, jnp.asarray(X_test), var, length, noise)
+        )
+        elapsed_compiled = time.perf_counter() - start
+
+        check = GPPosterior(var, length, noise)
+        check.extend(xs[:n], ys[:n])
+        mean, variance = check.predict(X_test)
+        diff = max(np.abs(mean - expected_mean).max(), np.abs(variance - expected_var).max())
+        print(f"{n:>6} {elapsed_new * 1e3:>18.1f} ms {elapsed_compiled * 1e3:>17.1f} ms "
+              f"{times[n] * 1e3:>9.2f} ms {diff:>11.1e}")
+    if not jax.config.jax_enable_x64:
+        print("(The notebook's predict runs in float32, so the differences are float32 round-off.)")
+
+    samples = gp.sample(rng, X_test, size=1000)
+    print(f"Mean of 1000 joint samples vs posterior mean: {np.abs(samples.mean(axis=0) - gp.mean(X_test)).max():.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Vectorized kernel (Gram) matrices for the Gaussian process code of `01_gp.ipynb`.
+
+`covariance` in the notebook evaluates `exp_quad_kernel` on a meshgrid of the
+inputs, which only works for 1-D inputs and builds two more N x N arrays, and
+`sample` calls it once per test point. Here, the Gram matrix is computed with
+broadcasting from the pairwise squared distances, for inputs of any dimension
+with one length scale per dimension (automatic relevance determination, ARD).
+Up to three dimensions, the differences are squared directly; above that, the
+distances are expanded as ||a||^2 + ||b||^2 - 2 a.b after centering the inputs,
+since the expansion of large, uncentered values cancels badly in float32. Rows are computed in
+blocks that fit in `max_block_bytes`, so the temporaries stay small for large
+N, and the result can be float32 to halve the memory of the matrix itself.
+"""
+import math
+import time
+
+from typing import Callable, Optional, Union
+
+import numpy as np
+
+ArrayLike = Union[float, np.ndarray]
+
+
+def _as_2d(x: np.ndarray, dtype) -> np.ndarray:
+    x = np.asarray(x, dtype=dtype)
+    return x[:, None] if x.ndim == 1 else x
+
+
+def squared_distance(x1: np.ndarray, x2: np.ndarray, length: ArrayLike = 1.0) -> np.ndarray:
+    """Pairwise squared distances (n1, n2) between the rows of x1 and x2 scaled by `length`.
+    Inputs are (n,) or (n, d); `length` is a scalar or one length scale per dimension."""
+    x1 = _as_2d(x1, None) / length
+    x2 = _as_2d(x2, None) / length
+    if x1.shape[1] <= 3:
+        return ((x1[:, None, :] - x2[None, :, :]) ** 2).sum(axis=2)
+    center = x2.mean(axis=0)
+    x1 = x1 - center
+    x2 = x2 - center
+    d = (x1 ** 2).sum(axis=1)[:, None] + (x2 ** 2).sum(axis=1)[None, :] - 2 * x1 @ x2.T
+    return np.maximum(d, 0, out=d)
+
+
+def exp_quad(x1: np.ndarray, x2: np.ndarray, var: float = 1.0, length: ArrayLike = 0.5) -> np.ndarray:
+    """The squared-exponential kernel; `exp_quad_kernel` of the notebook for var=1."""
+    d = squared_distance(x1, x2, length)
+    d *= -0.5
+    return var * np.exp(d, out=d)
+
+
+def matern(x1: np.ndarray, x2: np.ndarray, var: float = 1.0, length: ArrayLike = 0.5, nu: float = 2.5) -> np.ndarray:
+    """The Matern kernel for nu = 0.5, 1.5 or 2.5."""
+    r = np.sqrt(squared_distance(x1, x2, length))
+    if nu == 0.5:
+        return var * np.exp(-r)
+    if nu == 1.5:
+        s = math.sqrt(3) * r
+        return var * (1 + s) * np.exp(-s)
+    if nu == 2.5:
+        s = math.sqrt(5) * r
+        return var * (1 + s + s ** 2 / 3) * np.exp(-s)
+    raise ValueError(f"nu must be 0.5, 1.5 or 2.5, not {nu}")
+
+
+def gram(
+    x1: np.ndarray,
+    x2: Optional[np.ndarray] = None,
+    kernel: Callable[..., np.ndarray] = exp_quad,
+    dtype=np.float64,
+    max_block_bytes: int = 64 * 2**20,
+    out: Optional[np.ndarray] = None,
+    **params,
+) -> np.ndarray:
+    """
+    The Gram matrix K[i, j] = kernel(x1[i], x2[j]) of (n,) or (n, d) inputs.
+
+    x2: Defaults to x1.
+    dtype: np.float32 or np.float64, for the computation and the result.
+    max_block_bytes: The approximate memory of the temporaries of one block of rows.
+    out: An (n1, n2) array to write the result into.
+    params: Passed to `kernel`, e.g. var, length (scalar or per dimension) and nu.
+    """
+    x1 = _as_2d(x1, dtype)
+    x2 = x1 if x2 is None else _as_2d(x2, dtype)
+    params = {name: np.asarray(value, dtype=dtype) for name, value in params.items()}
+    n1, n2 = len(x1), len(x2)
+    if out is None:
+        out = np.empty((n1, n2), dtype=dtype)
+    # A kernel makes a few temporaries of the size of its block, and the
+    # differences of low-dimensional inputs one per dimension.
+    temporaries = 4 + (x1.shape[1] if x1.shape[1] <= 3 else 0)
+    rows = max(1, max_block_bytes // (temporaries * n2 * np.dtype(dtype).itemsize))
+    for start in range(0, n1, rows):
+        out[start:start + rows] = kernel(x1[start:start + rows], x2, **params)
+    return out
+
+
+def covariance(x1: np.ndarray, x2: np.ndarray, kernel: Callable[..., np.ndarray] = exp_quad) -> np.ndarray:
+    """`covariance` of the notebook, with the same output shapes: for inputs of
+    the same length, the matrix with rows indexed by x2 (as from the meshgrid);
+    otherwise one of them has length 1 and the result is a vector."""
+    if len(x1) == len(x2):
+        return gram(x2, x1, kernel)
+    assert len(x1) == 1 or len(x2) == 1
+    return gram(x1, x2, kernel).ravel()
+
+
+def main() -> None:
+    from scipy import stats
+
+    def exp_quad_kernel(x1: float, x2: float, length=0.5):
+        return np.exp(-(x1 - x2) ** 2 / (2 * length ** 2))
+
+    def covariance_meshgrid(x1: np.ndarray, x2: np.ndarray, kernel=exp_quad_kernel):
+        # `covariance` of the notebook.
+        if len(x1) == len(x2):
+            dim = len(x1)
+            g1, g2 = np.meshgrid(x1, x2)
+            return kernel(g1.reshape(dim * dim, ), g2.reshape(dim * dim, )).reshape(dim, dim)
+        return kernel(x1, x2)
+
+    def covariance_loop(x1: np.ndarray, x2: np.ndarray, kernel=exp_quad_kernel):
+        return np.array([[kernel(a, b) for a in x1] for b in x2])
+
+    x = np.linspace(0, 10, 1000)
+    start = time.perf_counter()
+    expected = covariance_loop(x, x)
+    elapsed_loop = time.perf_counter() - start
+    start = time.perf_counter()
+    meshgrid = covariance_meshgrid(x, x)
+    elapsed_meshgrid = time.perf_counter() - start
+    start = time.perf_counter()
+    K = covariance(x, x)
+    elapsed_gram = time.perf_counter() - start
+    print(f"Same matrix: {np.allclose(K, expected, atol=1e-12) and np.allclose(K, meshgrid, atol=1e-12)}")
+    print(f"N=1000, scalar kernel in loops: {elapsed_loop * 1e3:8.1f} ms")
+    print(f"N=1000, meshgrid:               {elapsed_meshgrid * 1e3:8.1f} ms")
+    print(f"N=1000, gram:                   {elapsed_gram * 1e3:8.1f} ms")
+
+    # `sample` of the notebook: the conditional mean at one new point.
+    x_obs = np.array([3.16, 3.02, 6.18, 6.01, 8.99, 9.07])
+    y_obs = np.array([0.71, 0.98, -1.75, -3.57, -0.03, 0.15])
+    x_new = np.array([5.0])
+    k = covariance(x_new, x_obs)
+    assert k.shape == covariance_meshgrid(x_new, x_obs).shape == (len(x_obs),)
+    mu = k.T @ np.linalg.inv(covariance(x_obs, x_obs)) @ y_obs
+    expected_mu = covariance_meshgrid(x_new, x_obs).T @ np.linalg.inv(covariance_meshgrid(x_obs, x_obs)) @ y_obs
+    print(f"Same conditional mean as the notebook's covariance: {np.isclose(mu, expected_mu)}")
+
+    # Sampling functions over the grid, as in the notebook.
+    start = time.perf_counter()
+    stats.multivariate_normal.rvs(mean=np.zeros(len(x)), cov=meshgrid, size=2)
+    elapsed_scipy = time.perf_counter() - start
+    start = time.perf_counter()
+    L = np.linalg.cholesky(K + 1e-8 * np.eye(len(x)))
+    L @ np.random.default_rng(0).standard_normal((len(x), 2))
+    elapsed_cholesky = time.perf_counter() - start
+    print(f"Two GP samples over 1000 points: multivariate_normal.rvs {elapsed_scipy * 1e3:.1f} ms, "
+          f"Cholesky {elapsed_cholesky * 1e3:.1f} ms")
+
+    # Multi-dimensional inputs with one length scale per dimension.
+    rng = np.random.default_rng(0)
+    X = rng.random((500, 3))
+    length = np.array([0.5, 1.0, 2.0])
+    direct = np.exp(-0.5 * (((X[:, None, :] - X[None, :, :]) / length) ** 2).sum(axis=2))
+    print(f"ARD squared exponential matches the direct formula: {np.allclose(gram(X, length=length), direct)}")
+    nu_05 = gram(X, kernel=matern, length=length, nu=0.5)
+    print(f"Matern 1/2 matches exp(-r): {np.allclose(nu_05, np.exp(-np.sqrt(-2 * np.log(direct))))}")
+
+    # float32 Gram matrices of inputs far from the origin, against float64.
+    for d in (1, 8):
+        X = 1000 + rng.random((500, d))
+        error = np.abs(gram(X, dtype=np.float32, length=0.5) - gram(X, length=0.5)).max()
+        print(f"d={d}, inputs around 1000: max |float32 - float64| = {error:.1e}")
+
+    X = rng.random((8000, 3))
+    for dtype in (np.float64, np.float32):
+        start = time.perf_counter()
+        K = gram(X, kernel=matern, dtype=dtype, length=length, nu=2.5, max_block_bytes=16 * 2**20)
+        elapsed = time.perf_counter() - start
+        print(f"N=8000, d=3, Matern 5/2, {np.dtype(dtype).name}: {elapsed:.2f} s, {K.nbytes / 2**20:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Sparse Gaussian process regression with inducing points, for `02_gp_ppl.ipynb` and `02_gp_regression.ipynb`.
+
+The exact `model` of the notebooks puts a `MultivariateNormal` over all N
+observations, so every SVI step factorizes the N x N kernel matrix: O(N^3)
+time and O(N^2) memory, which rules out more than a few thousand points.
+
+`sparse_model` is the FITC approximation of the same GP, built on the same
+`kernel` and priors. The function values at M inducing inputs Z carry the
+correlations: u = L v with v ~ N(0, I) and L L^T = K(Z, Z) (the "whitened"
+parameterization, which is easier for SVI). Given u, the observations are
+independent:
+
+    Y_i ~ N(k(x_i, Z) K(Z, Z)^-1 u, k(x_i, x_i) - k(x_i, Z) K(Z, Z)^-1 k(Z, x_i) + noise)
+
+Because the likelihood factorizes, it can be evaluated on a minibatch and
+scaled by N / batch size (a subsampled `numpyro.plate`), so an SVI step costs
+O(B M^2 + M^3) whatever N is. `fit_sparse` trains it with a Gaussian guide
+over v and the hyperparameters, in compiled blocks of SVI steps until the ELBO
+on a fixed subsample stops improving.
+"""
+import time
+
+from typing import Dict, Tuple
+
+import jax
+import jax.numpy as jnp
+import jax.random as random
+import numpy as np
+import numpyro
+import numpyro.distributions as dist
+import numpyro.optim as optim
+
+from jax import lax
+from jax.scipy.linalg import cho_solve, solve_triangular
+from numpyro.infer import SVI, Trace_ELBO
+from numpyro.infer.autoguide import AutoLaplaceApproximation, AutoMultivariateNormal
+
+
+# squared exponential kernel with diagonal noise term
+def kernel(X1, X2, var, length, noise, include_noise=True):
+    delta_sq = jnp.power((X1[:, None] - X2) / length, 2.0)
+    k = var * jnp.exp(-0.5 * delta_sq)
+    if include_noise:
+        noise = noise + 1.0e-6
+        k += noise * jnp.eye(X1.shape[0])
+    return k
+
+
+def model(X, Y):
+    # set uninformative log-normal priors on our three kernel hyperparameters
+    var = numpyro.sample("kernel_var", dist.LogNormal(0.0, 10.0))
+    noise = numpyro.sample("kernel_noise", dist.LogNormal(0.0, 10.0))
+    length = numpyro.sample("kernel_length", dist.LogNormal(0.0, 10.0))
+
+    # compute kernel
+    k = kernel(X, X, var, length, noise)
+
+    # sample Y according to the standard gaussian process formula
+    numpyro.sample("Y", dist.MultivariateNormal(loc=jnp.zeros(X.shape[0]), covariance_matrix=k), obs=Y)
+
+
+def sparse_model(X, Y, Z, n_data: int):
+    """The FITC model. X, Y: a minibatch of the n_data observations; Z: the inducing inputs."""
+    var = numpyro.sample("kernel_var", dist.LogNormal(0.0, 10.0))
+    noise = numpyro.sample("kernel_noise", dist.LogNormal(0.0, 10.0))
+    length = numpyro.sample("kernel_length", dist.LogNormal(0.0, 10.0))
+
+    # whitened inducing values: u = L v
+    v = numpyro.sample("v", dist.Normal(0.0, 1.0).expand([Z.shape[0]]).to_event(1))
+    mean, f_var = _conditional(X, Z, var, length, v)
+
+    with numpyro.plate("data", n_data, subsample_size=X.shape[0]):
+        numpyro.sample("Y", dist.Normal(mean, jnp.sqrt(f_var + noise)), obs=Y)
+
+
+def _conditional(X, Z, var, length, v) -> Tuple[jax.Array, jax.Array]:
+    """The mean and variance of f(X) given the whitened inducing values v."""
+    # Closely spaced inducing inputs make K(Z, Z) nearly singular in float32,
+    # so the jitter scales with the variance.
+    L = jnp.linalg.cholesky(kernel(Z, Z, var, length, 1.0e-4 * var))
+    A = solve_triangular(L, kernel(Z, X, var, length, 0.0, include_noise=False), lower=True)  # (M, N)
+    return A.T @ v, jnp.clip(var - jnp.sum(A ** 2, axis=0), 0.0)
+
+
+def predict_sparse(rng_key, Z, X_test, var, length, noise, v):
+    """Like `predict` of the notebook: the mean function and a sample of the
+    posterior predictive for one set of hyperparameters and inducing values."""
+    mean, f_var = _conditional(X_test, Z, var, length, v)
+    sigma_noise = jnp.sqrt(f_var + noise) * jax.random.normal(rng_key, X_test.shape[:1])
+    return mean, mean + sigma_noise
+
+
+def predict(rng_key, X, Y, X_test, var, length, noise):
+    """`predict` of the notebook, with a Cholesky solve instead of the inverse."""
+    k_pp = kernel(X_test, X_test, var, length, noise, include_noise=True)
+    k_pX = kernel(X_test, X, var, length, noise, include_noise=False)
+    chol = jnp.linalg.cholesky(kernel(X, X, var, length, noise, include_noise=True))
+    K = k_pp - k_pX @ cho_solve((chol, True), k_pX.T)
+    sigma_noise = jnp.sqrt(jnp.clip(jnp.diag(K), 0.0)) * jax.random.normal(rng_key, X_test.shape[:1])
+    mean = k_pX @ cho_solve((chol, True), Y)
+    return mean, mean + sigma_noise
+
+
+def fit_sparse(
+    rng_key,
+    X,
+    Y,
+    num_inducing: int = 32,
+    batch_size: int = 256,
+    max_steps: int = 30_000,
+    check_every: int = 500,
+    smoothing: float = 0.8,
+    rtol: float = 1.0e-2,
+    eval_size: int = 2048,
+    learning_rate: float = 0.01,
+) -> Tuple[AutoMultivariateNormal, Dict, jax.Array, int]:
+    """Fit `sparse_model` with minibatched SVI. The inducing inputs are spread
+    evenly over the range of X.
+
+    The minibatch losses are too noisy to tell when the fit has converged, so
+    every `check_every` steps the ELBO is evaluated on a fixed subsample of
+    `eval_size` observations with a fixed key. With a constant learning rate
+    the parameters keep jittering, and so does that ELBO, so it is smoothed
+    with an exponential moving average (weight `smoothing` on the past), and
+    the fit stops when one block changes the average by less than `rtol`
+    times its magnitude, or after `max_steps`. Returns the guide, its
+    parameters, Z and the number of steps.
+    """
+    n_data = X.shape[0]
+    batch_size = min(batch_size, n_data)
+    Z = jnp.linspace(X.min(), X.max(), num_inducing)
+    guide = AutoMultivariateNormal(sparse_model)
+    svi = SVI(sparse_model, guide, optim.Adam(learning_rate), Trace_ELBO())
+
+    rng_key, rng_init, rng_subsample, rng_elbo = random.split(rng_key, 4)
+    state = svi.init(rng_init, X[:batch_size], Y[:batch_size], Z, n_data)
+    eval_idx = random.choice(rng_subsample, n_data, (min(eval_size, n_data),), replace=False)
+
+    def evaluate(state):
+        loss = Trace_ELBO().loss(rng_elbo, svi.get_params(state), sparse_model, guide, X[eval_idx], Y[eval_idx], Z, n_data)
+        return loss / n_data
+
+    def block(state, rng_key):
+        def step(state, rng_key):
+            idx = random.randint(rng_key, (batch_size,), 0, n_data)
+            return svi.update(state, X[idx], Y[idx], Z, n_data)
+
+        state, _ = lax.scan(step, state, random.split(rng_key, check_every))
+        return state, evaluate(state)
+
+    def cond(carry):
+        _, _, steps, previous, smoothed = carry
+        return (steps < max_steps) & ~(jnp.abs(previous - smoothed) < rtol * jnp.abs(smoothed))
+
+    def body(carry):
+        state, rng_key, steps, _, previous = carry
+        rng_key, rng_block = random.split(rng_key)
+        state, loss = block(state, rng_block)
+        return state, rng_key, steps + check_every, previous, smoothing * previous + (1 - smoothing) * loss
+
+    @jax.jit
+    def run(state, rng_key):
+        carry = (state, rng_key, 0, jnp.inf, evaluate(state))
+        state, _, steps, _, _ = lax.while_loop(cond, body, carry)
+        return state, steps
+
+    state, steps = run(state, rng_key)
+    return guide, svi.get_params(state), Z, int(steps)
+
+
+def get_data(N=30, sigma_obs=0.15, N_test=400, seed=0):
+    """`get_data` of `02_gp_ppl.ipynb`, with random inputs."""
+    rng = np.random.default_rng(seed)
+    X = np.sort(rng.uniform(-1, 1, N))
+    Y = X + 0.5 * np.sin(4.0 * X) + sigma_obs * rng.standard_normal(N)
+    X_test = np.linspace(-1.3, 1.3, N_test)
+    return jnp.asarray(X), jnp.asarray(Y), jnp.asarray(X_test)
+
+
+def main() -> None:
+    rng_key = random.PRNGKey(0)
+    n_samples = 200
+
+    def evaluate(means, predictions, X_test) -> Tuple[float, float]:
+        """RMSE of the mean prediction against the true function inside the
+        data range, and the mean width of the 90% predictive band there."""
+        inside = jnp.abs(X_test) <= 1
+        truth = X_test + 0.5 * jnp.sin(4.0 * X_test)
+        mean = jnp.mean(means, axis=0)
+        low, high = jnp.percentile(predictions, jnp.array([5.0, 95.0]), axis=0)
+        rmse = float(jnp.sqrt(jnp.mean((mean - truth)[inside] ** 2)))
+        return rmse, float(jnp.mean((high - low)[inside]))
+
+    print(f"{'N':>7} {'method':>12} {'fit':>9} {'steps':>7} {'RMSE':>7} {'90% band width':>15}")
+    for N in (250, 1000, 10_000, 100_000):
+        X, Y, X_test = get_data(N)
+
+        if N <= 1000:
+            # The notebook: Laplace approximation with SVI over the exact model.
+            rng_key, rng_key_ = random.split(rng_key)
+            start = time.perf_counter()
+            guide = AutoLaplaceApproximation(model)
+            svi = SVI(model, guide, optim.Adam(0.1), Trace_ELBO(), X=X, Y=Y)
+            params = svi.run(rng_key_, 1000, progress_bar=False).params
+            jax.block_until_ready(params)
+            elapsed = time.perf_counter() - start
+            rng_key, rng_samples, rng_predict = random.split(rng_key, 3)
+            samples = guide.sample_posterior(rng_samples, params, sample_shape=(n_samples,))
+            keys = random.split(rng_predict, n_samples)
+            # Each sample factorizes an N x N matrix; vmapping all of them at
+            # once takes gigabytes at N = 1000, so they go in chunks.
+            means, predictions = lax.map(
+                lambda args: predict(args[0], X, Y, X_test, *args[1:]),
+                (keys, samples["kernel_var"], samples["kernel_length"], samples["kernel_noise"]),
+                batch_size=10,
+            )
+            rmse, width = evaluate(means, predictions, X_test)
+            print(f"{N:>7} {'exact':>12} {elapsed:>7.1f} s {1000:>7} {rmse:>7.3f} {width:>15.3f}")
+
+        rng_key, rng_key_ = random.split(rng_key)
+        start = time.perf_counter()
+        guide, params, Z, steps = fit_sparse(rng_key_, X, Y)
+        jax.block_until_ready(params)
+        elapsed = time.perf_counter() - start
+        rng_key, rng_samples, rng_predict = random.split(rng_key, 3)
+        samples = guide.sample_posterior(rng_samples, params, sample_shape=(n_samples,))
+        keys = random.split(rng_predict, n_samples)
+        means, predictions = jax.vmap(
+            lambda key, var, length, noise, v: predict_sparse(key, Z, X_test, var, length, noise, v)
+        )(keys, samples["kernel_var"], samples["kernel_length"], samples["kernel_noise"], samples["v"])
+        rmse, width = evaluate(means, predictions, X_test)
+        print(f"{N:>7} {'sparse M=32':>12} {elapsed:>7.1f} s {steps:>7} {rmse:>7.3f} {width:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()